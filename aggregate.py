@@ -0,0 +1,178 @@
+# coding=utf-8
+#
+# Group records and combine each group into one record, by rules declared
+# per header:
+#
+# FIRST: the value of the first record in the group,
+# SUM: the sum of the values,
+# weighted(header): the average of the values, weighted by the values
+#	under another header, e.g., weighted('quantity').
+#
+# Records are given a group id (groups numbered in the order their first
+# record appears), then sorted by group id (a counting sort, so records of
+# a group keep their order). Each header is then evaluated as a column over
+# all the groups at once, sums with math.fsum so that the result does not
+# depend on the order of the records. For example, total holdings by
+# portfolio and currency:
+#
+# aggregate(records, ['portfolio', 'currency'],
+#			{'portfolio': FIRST, 'currency': FIRST}, default=SUM)
+#
+# HOLDING_RULES are the rules for trustee holding records, used by
+# trustee.patchHtmBondRecords() and report.consolidateRecords().
+#
+
+from itertools import accumulate
+from operator import mul
+from math import fsum
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+FIRST = 'first'
+SUM = 'sum'
+
+def weighted(header):
+	return ('weighted', header)
+
+
+
+HOLDING_RULES = dict(
+	[(header, FIRST) for header in
+		[ 'maturity', 'coupon', 'interest start day', 'market price', 'type'
+		, 'currency', 'accounting', 'description', 'isin', 'valuation date'
+		, 'ticker', 'last trade day']] +
+	[(header, weighted('quantity')) for header in ['average cost', 'amortized cost']])
+
+
+
+def aggregate(records, key, rules=HOLDING_RULES, default=SUM):
+	"""
+	[iterable] records, [function or list] key, [dictionary] rules, rule
+		=> [list] one record per group, in the order of the groups.
+
+	key: a function giving the key of a record, or a list of headers whose
+		values make the key.
+	rules: header => rule, headers not there use the default rule.
+	"""
+	records = records if isinstance(records, list) else list(records)
+	ids, count = groupIds(records, key)
+	return aggregateGroups(records, ids, count, rules, default)
+
+
+
+def groupIds(records, key):
+	"""
+	[list] records, [function or list] key => [list] group id of each
+		record, [int] number of groups
+	"""
+	if not callable(key):
+		headers = list(key)
+		key = lambda record: tuple(record[h] for h in headers)
+
+	groups = {}
+	ids = [groups.setdefault(k, len(groups)) for k in map(key, records)]
+	return ids, len(groups)
+
+
+
+def aggregateGroups(records, ids, count, rules=HOLDING_RULES, default=SUM):
+	"""
+	[list] records, [list] group id of each record, [int] number of groups,
+	[dictionary] rules, rule => [list] one record per group
+
+	Group ids run from 0 to count-1, ordered by the first record of each
+	group. A group of one record gives that record as it is, the record of
+	a bigger group has the headers of its first record, in the same order.
+	"""
+	checkRule(default)
+	for rule in rules.values():
+		checkRule(rule)
+
+	order, starts = sortByGroup(ids, count)
+	result = [None] * count
+	layouts = {}	# headers of the first record => ids of bigger groups
+	for g in range(count):
+		first = records[order[starts[g]]]
+		if starts[g+1] - starts[g] == 1:
+			result[g] = first
+		else:
+			layouts.setdefault(tuple(first.keys()), []).append(g)
+
+	for (layout, groups) in layouts.items():
+		rows, bounds = [], [0]
+		for g in groups:
+			rows.extend(order[starts[g]:starts[g+1]])
+			bounds.append(len(rows))
+
+		columns = {}
+		def column(header):
+			try:
+				return columns[header]
+			except KeyError:
+				return columns.setdefault(header, [records[r][header] for r in rows])
+
+		values = [evaluate(rules.get(h, default), column, h, bounds) for h in layout]
+		for (i, g) in enumerate(groups):
+			result[g] = {h: v[i] for (h, v) in zip(layout, values)}
+
+	return result
+
+
+
+def sortByGroup(ids, count):
+	"""
+	[list] group ids, [int] number of groups => [list] record positions
+		sorted by group id, [list] where each group starts in that list
+		(count + 1 positions, the last being the end).
+	"""
+	sizes = [0] * count
+	for g in ids:
+		sizes[g] = sizes[g] + 1
+
+	starts = list(accumulate([0] + sizes))
+	position = starts[:-1]
+	order = [0] * len(ids)
+	for (i, g) in enumerate(ids):
+		order[position[g]] = i
+		position[g] = position[g] + 1
+
+	return order, starts
+
+
+
+def evaluate(rule, column, header, bounds):
+	"""
+	rule, [function] header => column values, [string] header, [list]
+		bounds of the groups in the column => [list] value of each group
+	"""
+	values = column(header)
+	groups = list(zip(bounds, bounds[1:]))
+	if rule == FIRST:
+		return [values[start] for (start, end) in groups]
+	if rule == SUM:
+		return [fsum(values[start:end]) for (start, end) in groups]
+
+	weights = column(rule[1])
+	products = list(map(mul, values, weights))
+	result = []
+	for (start, end) in groups:
+		total = fsum(weights[start:end])
+		if total == 0:
+			logger.error('evaluate(): total weight of \'{0}\' is 0'.format(header))
+			raise ValueError
+
+		result.append(fsum(products[start:end]) / total)
+
+	return result
+
+
+
+def checkRule(rule):
+	if rule in (FIRST, SUM) or \
+		(isinstance(rule, tuple) and len(rule) == 2 and rule[0] == 'weighted'):
+		return
+
+	logger.error('checkRule(): invalid rule {0}'.format(rule))
+	raise ValueError
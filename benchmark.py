@@ -0,0 +1,163 @@
+# coding=utf-8
+#
+# Time each stage of the trustee file pipeline on synthetic reports of
+# growing size, and report throughput and peak memory per stage.
+#
+# The stages are:
+#
+# fileToLines, linesToSections, sectionToRecords, parseSections (the
+# single pass parser doing the work of the two stages before it),
+# patchHtmBondRecords (per file), then consolidateRecords and writeTSCF
+# (per folder).
+#
+# Each stage runs twice, once for wall time, then once more under
+# tracemalloc for peak memory, so that the tracing does not slow down the
+# timing. Run it like:
+#
+# python benchmark.py --sizes 100 1000 5000 --files 10 --json bench.json
+#
+
+from clamc_trustee.trustee import fileToLines, linesToSections, \
+									sectionToRecords, parseSections, \
+									patchHtmBondRecords
+from clamc_trustee.report import consolidateRecords, htmBond, readFiles, \
+									writeTSCF
+from clamc_trustee.synthetic import writeFolder
+import os, time, tracemalloc, tempfile, shutil, json
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+STAGES = ['fileToLines', 'linesToSections', 'sectionToRecords',
+		  'parseSections', 'patchHtmBondRecords', 'consolidateRecords', 'writeTSCF']
+
+
+
+def measure(function, *args):
+	"""
+	[function] function, args => result, [float] seconds, [int] peak bytes
+
+	Run the function twice, first for time, then for peak memory.
+	"""
+	start = time.perf_counter()
+	result = function(*args)
+	seconds = time.perf_counter() - start
+
+	tracemalloc.start()
+	function(*args)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return result, seconds, peak
+
+
+
+def benchmarkFolder(files):
+	"""
+	[list] files in a folder => [dictionary] stage => measurement
+
+	A measurement is a dictionary of seconds, items processed (rows for
+	fileToLines, linesToSections and parseSections, records for the
+	others), items per second and peak memory in bytes. Times and items
+	are summed over the files, peak memory is the maximum.
+	"""
+	stats = {stage: {'seconds': 0, 'items': 0, 'peak bytes': 0} for stage in STAGES}
+	def add(stage, seconds, items, peak):
+		stats[stage]['seconds'] += seconds
+		stats[stage]['items'] += items
+		stats[stage]['peak bytes'] = max(stats[stage]['peak bytes'], peak)
+
+	for file in files:
+		lines, seconds, peak = measure(fileToLines, file)
+		add('fileToLines', seconds, len(lines), peak)
+
+		sections, seconds, peak = measure(linesToSections, lines)
+		add('linesToSections', seconds, len(lines), peak)
+
+		toRecords = lambda sections: [list(sectionToRecords(s)[0]) for s in sections]
+		records, seconds, peak = measure(toRecords, sections[1:])
+		add('sectionToRecords', seconds, sum(map(len, records)), peak)
+
+		parse = lambda lines: list(parseSections(lines))
+		_, seconds, peak = measure(parse, lines)
+		add('parseSections', seconds, len(lines), peak)
+
+		htmRecords = []
+		for section in sections[1:]:
+			sectionRecords, sectionType, accounting = sectionToRecords(section)
+			if (sectionType, accounting) == ('bond', 'htm'):
+				htmRecords.append(list(sectionRecords))
+
+		patch = lambda groups: [list(patchHtmBondRecords(g)) for g in groups]
+		patched, seconds, peak = measure(patch, htmRecords)
+		add('patchHtmBondRecords', seconds, sum(map(len, htmRecords)), peak)
+
+	folder = os.path.dirname(files[0])
+	records = list(filter(htmBond, readFiles(folder)))
+	consolidate = lambda records: list(consolidateRecords(records))
+	_, seconds, peak = measure(consolidate, records)
+	add('consolidateRecords', seconds, len(records), peak)
+
+	_, seconds, peak = measure(writeTSCF, folder)
+	add('writeTSCF', seconds, len(records), peak)
+
+	for stage in stats.values():
+		stage['items per second'] = stage['items']/stage['seconds'] \
+										if stage['seconds'] > 0 else 0
+	return stats
+
+
+
+def runBenchmark(sizes, files=10, lots=3, seed=1):
+	"""
+	[list] sizes (number of HTM bonds per file), [int] files per folder,
+	[int] max. lots per bond, [int] seed => [list] results
+
+	Each result is a dictionary with the size and the stage measurements.
+	"""
+	results = []
+	for size in sizes:
+		folder = tempfile.mkdtemp()
+		try:
+			logger.info('runBenchmark(): size {0}'.format(size))
+			generated = writeFolder(folder, files, seed=seed, bonds=size,
+									lots=lots, equities=size//10, afsBonds=size//10)
+			results.append({ 'bonds per file': size
+						   , 'files': files
+						   , 'stages': benchmarkFolder(generated)
+						   })
+		finally:
+			shutil.rmtree(folder)
+
+	return results
+
+
+
+def printResults(results):
+	print('{0:>8} {1:>6} {2:<20} {3:>10} {4:>10} {5:>14} {6:>12}'.format(
+			'bonds', 'files', 'stage', 'items', 'seconds', 'items/second', 'peak KB'))
+	for result in results:
+		for stage in STAGES:
+			s = result['stages'][stage]
+			print('{0:>8} {1:>6} {2:<20} {3:>10} {4:>10.4f} {5:>14.0f} {6:>12.0f}'.format(
+					result['bonds per file'], result['files'], stage, s['items'],
+					s['seconds'], s['items per second'], s['peak bytes']/1024))
+
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='Benchmark the trustee pipeline')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 3000],
+						help='number of HTM bonds per file')
+	parser.add_argument('--files', type=int, default=10, help='files per folder')
+	parser.add_argument('--lots', type=int, default=3, help='max. lots per HTM bond')
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--json', help='write the results to this json file')
+	args = parser.parse_args()
+
+	results = runBenchmark(args.sizes, args.files, args.lots, args.seed)
+	printResults(results)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent=2)
@@ -0,0 +1,162 @@
+# coding=utf-8
+#
+# A persistent cache of records parsed from trustee excel files.
+#
+# Records of a file are saved under a key made of a hash of the file's
+# content, the parser version and the reference maps (headerMap, idMap and
+# bondIsinMap) in trustee.py. An unchanged file is then loaded from the
+# cache, while a changed file, a new parser version or a change in the maps
+# gives a new key and the file is parsed again.
+#
+# For example,
+#
+# cache = RecordCache('record_cache')
+# records = cache.fileToRecords(file)
+# records = readFiles(folder, cache.fileToRecords)
+#
+
+from clamc_trustee import trustee
+from hashlib import sha1
+from os.path import join
+import os, pickle, zlib
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def fileHash(fileName, blockSize=1024*1024):
+	"""
+	[string] file name => [string] sha1 hex digest of the file's content
+	"""
+	h = sha1()
+	with open(fileName, 'rb') as f:
+		for block in iter(lambda: f.read(blockSize), b''):
+			h.update(block)
+
+	return h.hexdigest()
+
+
+
+def referenceKey():
+	"""
+	=> [string] a hash of the parser version and the reference maps used
+		by the parser.
+	"""
+	return sha1(repr(( trustee.PARSER_VERSION
+					 , sorted(trustee.headerMap.items())
+					 , sorted(trustee.idMap.items())
+					 , sorted(trustee.bondIsinMap.items())
+					 )).encode('utf-8')).hexdigest()
+
+
+
+class RecordCache():
+	"""
+	Records of trustee files, stored in a folder as compressed pickles, one
+	file per entry.
+
+	When the total size of the entries goes beyond maxSize (bytes), least
+	recently used entries are removed. An entry is marked as used by
+	touching its modification time.
+	"""
+	def __init__(self, directory, maxSize=256*1024*1024):
+		self.directory = directory
+		self.maxSize = maxSize
+		os.makedirs(directory, exist_ok=True)
+
+
+	def fileToRecords(self, fileName):
+		"""
+		[string] file name => [list] records in that file
+
+		Same as trustee.fileToRecords(), but use the cached records if
+		there are any.
+		"""
+		entry = self.entryFile(fileName)
+		try:
+			with open(entry, 'rb') as f:
+				records = pickle.loads(zlib.decompress(f.read()))
+			os.utime(entry)
+			logger.debug('fileToRecords(): cache hit {0}'.format(fileName))
+			return records
+		except FileNotFoundError:
+			pass
+		except (pickle.UnpicklingError, zlib.error, EOFError):
+			logger.warning('fileToRecords(): bad cache entry {0}'.format(entry))
+
+		records = trustee.fileToRecords(fileName)
+		self.save(entry, records)
+		return records
+
+
+	def iterFileRecords(self, fileName):
+		"""
+		[string] file name => [iterable] records in that file
+		"""
+		return iter(self.fileToRecords(fileName))
+
+
+	def entryFile(self, fileName):
+		"""
+		[string] file name => [string] full path to the cache entry of
+			that file.
+		"""
+		return join(self.directory, sha1((fileHash(fileName) + \
+					referenceKey()).encode('utf-8')).hexdigest() + '.rec')
+
+
+	def save(self, entry, records):
+		"""
+		Write an entry, then remove old entries if the cache is too big.
+
+		The entry is written to a temporary file first and then renamed,
+		so that a reader never sees a half written entry.
+		"""
+		temp = entry + '.{0}.tmp'.format(os.getpid())
+		with open(temp, 'wb') as f:
+			f.write(zlib.compress(pickle.dumps(records, pickle.HIGHEST_PROTOCOL)))
+		os.replace(temp, entry)
+		self.evict()
+
+
+	def entries(self):
+		"""
+		=> [list] (modification time, size, path) of cache entries, least
+			recently used first.
+		"""
+		result = []
+		for f in os.listdir(self.directory):
+			if f.endswith('.rec'):
+				try:
+					s = os.stat(join(self.directory, f))
+					result.append((s.st_mtime, s.st_size, join(self.directory, f)))
+				except FileNotFoundError:
+					pass	# removed by another process
+
+		return sorted(result)
+
+
+	def evict(self):
+		"""
+		Remove least recently used entries until the cache size is within
+		maxSize.
+		"""
+		entries = self.entries()
+		totalSize = sum(size for (_, size, _) in entries)
+		for (_, size, path) in entries:
+			if totalSize <= self.maxSize:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			totalSize = totalSize - size
+
+
+	def clear(self):
+		"""
+		Remove all entries, e.g., after the parsing logic has changed
+		without a change in trustee.PARSER_VERSION.
+		"""
+		for (_, _, path) in self.entries():
+			os.remove(path)
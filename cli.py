@@ -0,0 +1,147 @@
+# coding=utf-8
+#
+# One command line entry point for the jobs of this package:
+#
+# python cli.py tscf trustee_reports [--previous last.full.inc --tolerance 1e-6]
+#	TSCF upload of HTM bond amortized cost, see report.writeTSCF()
+# python cli.py htm trustee_reports
+#	consolidated HTM bond csv, see report.writeHtmRecords()
+# python cli.py historical historical_data [--workers 4 --cache cache]
+#	TSCF upload of purchase cost and yield at cost, see hcost.writeTSCF()
+# python cli.py dates trustee_reports
+#	portfolio and valuation date of each trustee file in the folder
+#
+# Nothing but argparse is imported to start with. Each subcommand has a
+# loader that imports what the subcommand needs (xlrd, report.py, hcost.py
+# and its packages, etc.) and returns the function doing the job, so a
+# short job like 'dates' does not pay for the others. Logging goes to the
+# console, unless --log-config gives a logging configuration file like
+# logging.config (loading one takes a while, so it is not the default).
+#
+# See startup.py for the cold start time of each subcommand.
+#
+
+import argparse, sys
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def loadTSCF():
+	from clamc_trustee.report import writeTSCF
+
+	def run(args):
+		return writeTSCF(args.folder, previousFile=args.previous,
+						tolerance=args.tolerance)
+
+	return run
+
+
+
+def loadHtm():
+	from clamc_trustee.report import writeHtmRecords
+
+	def run(args):
+		return writeHtmRecords(args.folder)
+
+	return run
+
+
+
+def loadHistorical():
+	from clamc_trustee.hcost import writeTSCF
+
+	def run(args):
+		return writeTSCF(args.folder, args.workers, args.cache)
+
+	return run
+
+
+
+def loadDates():
+	from clamc_trustee.trustee import readFileInfo
+	from clamc_trustee.report import getExcelFiles
+	from os.path import basename
+
+	def run(args):
+		for file in getExcelFiles(args.folder):
+			valuationDate, portfolioId = readFileInfo(file)
+			print('{0}\t{1}\t{2}'.format(portfolioId, valuationDate, basename(file)))
+
+	return run
+
+
+
+"""
+subcommand => loader, help
+"""
+COMMANDS = { 'tscf': (loadTSCF, 'TSCF upload of HTM bond amortized cost')
+		   , 'htm': (loadHtm, 'consolidated HTM bond csv')
+		   , 'historical': (loadHistorical, 'TSCF upload of historical cost')
+		   , 'dates': (loadDates, 'valuation date of each trustee file')
+		   }
+
+
+
+def load(command):
+	"""
+	[string] subcommand => [function] args => result of the job, after
+		importing what the subcommand needs.
+	"""
+	return COMMANDS[command][0]()
+
+
+
+def makeParser():
+	parser = argparse.ArgumentParser(description='Trustee reports and TSCF uploads')
+	parser.add_argument('--log-config', help='logging configuration file, '
+						'e.g., logging.config')
+	subparsers = parser.add_subparsers(dest='command', required=True)
+	for (command, (loader, help)) in COMMANDS.items():
+		subparser = subparsers.add_parser(command, help=help)
+		subparser.add_argument('folder')
+
+	subparsers.choices['tscf'].add_argument('--previous',
+		help='the full upload of the last run (.inc or .full.inc), upload '
+			'only rows added or changed since then')
+	subparsers.choices['tscf'].add_argument('--tolerance', type=float, default=0)
+	subparsers.choices['historical'].add_argument('--workers', type=int, default=1)
+	subparsers.choices['historical'].add_argument('--cache',
+		help='folder to cache the historical data')
+	return parser
+
+
+
+def configureLogging(configFile=None):
+	if configFile is None:
+		logging.basicConfig(level=logging.WARNING,
+							format='%(levelname)s %(module)s : %(message)s')
+	else:
+		from logging.config import fileConfig
+		fileConfig(configFile, disable_existing_loggers=False)
+
+
+
+def main(argv=None):
+	"""
+	[list] arguments (sys.argv[1:] if None) => [int] exit status
+
+	The result of the job (the file written), if any, is printed.
+	"""
+	args = makeParser().parse_args(argv)
+	configureLogging(args.log_config)
+	try:
+		result = load(args.command)(args)
+	except Exception:
+		logger.exception('main(): {0} failed'.format(args.command))
+		return 1
+
+	if result is not None:
+		print(result)
+	return 0
+
+
+
+
+if __name__ == '__main__':
+	sys.exit(main())
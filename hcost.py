@@ -19,19 +19,24 @@
 # CD021,4,HK0000171949,12229,100,100
 # CD022,4,HK0000171949,12229,6.5,6.5
 # ...
+#
+# The utils and clamc_datafeed packages are imported by the functions that
+# use them, so that importing this module (e.g., by cli.py) is quick.
+#
 
-from xlrd import open_workbook
 from itertools import takewhile, chain, filterfalse
 from functools import reduce, partial
 import re
-from os.path import join
+from os.path import join, basename
 from datetime import datetime
 from collections import namedtuple
-from utils.iter import pop, firstOf
-from utils.excel import worksheetToLines
-from utils.utility import writeCsv
-from clamc_datafeed import feeder
 from clamc_trustee.report import getExcelFiles
+from clamc_trustee.instrument import stage
+from clamc_trustee.tscf import writeUpload, tscfRow
+from clamc_trustee.xlsx import isXlsx, xlsxRows
+from clamc_trustee.sheet import loadSheet
+from clamc_trustee.cache import fileHash
+import os, pickle
 import logging
 logger = logging.getLogger(__name__)
 
@@ -43,6 +48,7 @@ def getRawPositions(lines):
 
 	lines: rows in a file, where each row is a list of columns
 	"""
+	from utils.iter import pop
 	nonEmpty = lambda s: s.strip() != ''
 	toLower = lambda s: s.lower()
 	headers = list(takewhile(nonEmpty, map(toLower, map(str, pop(lines)))))
@@ -54,6 +60,10 @@ def getRawPositions(lines):
 
 
 
+Value = namedtuple('Value', ['purchase_cost', 'yield_at_cost'])
+
+
+
 def toDictionary(positions):
 	"""
 	[Iterable] positions => [Dictionary] a dictionary mapping the isin
@@ -62,8 +72,6 @@ def toDictionary(positions):
 	The positions are the raw positions from the file containing all the
 	historical cost and yield at cost.
 	"""
-	Value = namedtuple('Value', ['purchase_cost', 'yield_at_cost'])
-
 	def addEntry(d, position):
 		d[position['isin']] = Value(position['purchase cost']
 								   , position['yield at cost'])
@@ -74,51 +82,103 @@ def toDictionary(positions):
 
 
 
+def historicalData(dataFile, cacheDir=None):
+	"""
+	[String] data file, [String] cache folder => [Dictionary] see 
+		toDictionary()
+
+	If cacheDir is given, the dictionary is saved there under the name and
+	hash of the data file, like 'historical.<file name>.<hash>.pickle', and
+	loaded from there as long as the data file does not change. Entries of
+	older versions of the same data file are removed, those of other data
+	files sharing the folder are kept.
+	"""
+	if cacheDir is None:
+		return toDictionary(getRawPositions(fileToLines(dataFile)))
+
+	prefix = 'historical.' + basename(dataFile) + '.'
+	entry = join(cacheDir, prefix + fileHash(dataFile) + '.pickle')
+	try:
+		with open(entry, 'rb') as f:
+			logger.debug('historicalData(): cache hit {0}'.format(dataFile))
+			return pickle.load(f)
+	except FileNotFoundError:
+		pass
+	except (pickle.UnpicklingError, EOFError, AttributeError):
+		logger.warning('historicalData(): bad cache entry {0}'.format(entry))
+
+	data = toDictionary(getRawPositions(fileToLines(dataFile)))
+	os.makedirs(cacheDir, exist_ok=True)
+	for name in os.listdir(cacheDir):
+		if isStaleEntry(name, prefix):
+			try:
+				os.remove(join(cacheDir, name))
+			except FileNotFoundError:	# removed by another process
+				pass
+
+	with open(entry + '.tmp', 'wb') as f:
+		pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+	os.replace(entry + '.tmp', entry)
+	return data
+
+
+
+def isStaleEntry(name, prefix):
+	"""
+	[String] file name in the cache folder, [String] prefix of the entries
+		of a data file => [Bool] is it an entry of that data file
+
+	The part between the prefix and '.pickle' must be a hash, so that a
+	data file whose name starts with the name of another one, like 'a.xlsx'
+	and 'a.xlsx.old.xlsx', does not lose its entry.
+	"""
+	return name.startswith(prefix) and name.endswith('.pickle') and \
+			all(c in '0123456789abcdef' for c in name[len(prefix):-len('.pickle')])
+
+
+
 def bonds(lines):
 	"""
 	[Iterable] lines => [Iterable] bond entries
 
 	lines: lines from a Geneva tax lot appraisal report.
-	bond entries: a list of tuples representing bond holdings, like
-	('12229', 'XS1234567890')
+	bond entries: a sorted list of tuples representing bond holdings, like
+	('12229', 'XS1234567890'), sorted so that the output is the same from
+	run to run.
 	"""
+	from clamc_datafeed import feeder
 	isinFromId = lambda id: id.split()[0]
 	bondEntry = lambda p: (p['Portfolio'], isinFromId(p['InvestID']))
 	secondTupleElement = lambda t: t[1]
-	return set(map(bondEntry
-				  , filter(feeder.isBond
-				  		  , secondTupleElement(
-				  		  		feeder.getPositionsFromTaxlots(lines)))))
+	return sorted(set(map(bondEntry
+				  		 , filter(feeder.isBond
+				  		 		 , secondTupleElement(
+				  		  			feeder.getPositionsFromTaxlots(lines))))))
 
 
 
-def tscfRows(data, bondEntry):
+def bondEmissions(data, bondEntry):
 	"""
-	[Dictionary] data, [Tuple] Bond entry => [List] TSCF Rows
+	[Dictionary] data, [Tuple] Bond entry => [Iterable] TSCF emissions
 
 	data: a dictionary mapping a bond to its purchase cost and yield at cost
 
-	A TSCF upload row consists of 4 elements, i.e.,
-
-	Field Id,Security Id Type,Security Id,Account Code,Numeric Value,Char Value
-	
-	Since we are uploading two values per bond entry, i.e., purchase cost 
-	(CD022) and yield at cost (CD021), then the return value will a list of
-	2 lines (each being a list itself) for a bond entry like
-	('12229', 'HK0000171949'), such as:
+	An emission is a tuple (field id, security id, account, value), see
+	tscf.py. Since we are uploading two values per bond entry, i.e., purchase
+	cost (CD022) and yield at cost (CD021), there are 2 emissions for a bond
+	entry like ('12229', 'HK0000171949'), which become the TSCF rows:
 
 	CD022,4,HK0000171949,12229,98.89,98.89
 	CD021,4,HK0000171949,12229,6.535,6.535
 	
-	If the bond is not found in 'data', then return value will be an empty
-	list []. At the same time, it will print out a warning message.
+	If the bond is not found in 'data', then there is no emission. At the
+	same time, it will print out a warning message.
 	"""
 	portfolio, isin = bondEntry
 	try:
 		value = data[isin]
-		return [ 
-				 ['CD022', '4', isin, portfolio, value.purchase_cost, value.purchase_cost]
-			   , ['CD021', '4', isin, portfolio, value.yield_at_cost, value.yield_at_cost]
+		return [ ('CD022', isin, portfolio, value.purchase_cost)
+			   , ('CD021', isin, portfolio, value.yield_at_cost)
 			   ]
 	except KeyError:
 		print('{0} not found in historical data'.format(bondEntry))
@@ -126,13 +186,20 @@ def tscfRows(data, bondEntry):
 
 
 
-def fileToLines(file):
+def fileToLines(file, sheet=0):
 	"""
-	[String] file => [Iterable] lines
+	[String] file, [Int or String] sheet index or name => [Iterable] lines
 
-	Read the first sheet of an Excel file and convert its rows to lines
+	Read a sheet (the first by default) of an Excel file and convert its
+	rows to lines. An .xlsx file (tax lot reports, historical data) is read
+	row by row without loading the whole workbook, see xlsx.py. Other files
+	are loaded one sheet only, see sheet.loadSheet().
 	"""
-	return worksheetToLines(open_workbook(file).sheet_by_index(0))
+	if isXlsx(file):
+		return xlsxRows(file, sheet)
+
+	from utils.excel import worksheetToLines
+	return worksheetToLines(loadSheet(file, sheet))
 
 
 
@@ -143,51 +210,98 @@ def fileToTSCF(data, file):
 	data: a dictionary mapping a bond to its purchase cost and yield at cost
 	file: a Geneva tax lot appraisal report (Excel)	
 	"""
+	return map(tscfRow, fileToEmissions(data, file))
+
+
+
+def fileToEmissions(data, file):
+	"""
+	[Dictionary] data, [String] file => [Iterable] TSCF emissions, see
+		bondEmissions().
+	"""
 	print('fileToTSCF(): working on {0}'.format(file))
 
-	glueTogether = lambda L: reduce(chain, L, [])
-	return glueTogether(map(partial(tscfRows, data)
-						   , bonds(fileToLines(file))))
+	with stage('fileToTSCF', file) as s:
+		bondEntries = bonds(fileToLines(file))
+		s.count(bonds=len(bondEntries))
+
+	return chain.from_iterable(map(partial(bondEmissions, data), bondEntries))
+
+
+
+def folderToTSCF(folder, workers=1, cacheDir=None):
+	"""
+	[String] folder, [Int] workers, [String] cache folder => [Iterable] TSCF
+		rows
+
+	See folderToEmissions().
+	"""
+	return map(tscfRow, folderToEmissions(folder, workers, cacheDir))
 
 
 
-def folderToTSCF(folder):
+def folderToEmissions(folder, workers=1, cacheDir=None):
 	"""
-	[String] folder => [Iterable] TSCF rows
+	[String] folder, [Int] workers, [String] cache folder => [Iterable] TSCF
+		emissions
 
 	folder: a folder containing the historical data file and all the Geneva
 		tax lot appraisal report files (Excel).
+	workers: number of worker processes for the tax lot files, 1 means
+		they are processed in this process, None means one worker per CPU
+		core. Each worker gets the historical data once. Emissions come out
+		in the same order either way, i.e., by file then by bond entry.
+	cacheDir: where to cache the historical data, see historicalData().
 	"""
-	isHistoricalDataFile = lambda f: f.split('\\')[-1].startswith('CLO Holdings')
-	dataFile = firstOf(isHistoricalDataFile, getExcelFiles(folder))
+	from utils.iter import firstOf
+	isHistoricalDataFile = lambda f: basename(f).startswith('CLO Holdings')
+	files = getExcelFiles(folder)
+	dataFile = firstOf(isHistoricalDataFile, files)
 	if (dataFile == None):
 		print('folderToTSCF(): data file not found')
 		raise ValueError
 	else:
 		print('folderToTSCF(): data file: {0}'.format(dataFile))
 
-	historicalData = toDictionary(getRawPositions(fileToLines(dataFile)))
+	with stage('historicalData', dataFile) as s:
+		data = historicalData(dataFile, cacheDir)
+		s.count(bonds=len(data))
+
+	taxlotFiles = list(filterfalse(isHistoricalDataFile, files))
+	if workers == 1:
+		return chain.from_iterable(map(partial(fileToEmissions, data), taxlotFiles))
+
+	from concurrent.futures import ProcessPoolExecutor
+	with ProcessPoolExecutor(max_workers=workers, initializer=_setHistoricalData
+							, initargs=(data,)) as executor:
+		return list(chain.from_iterable(executor.map(_fileToEmissions, taxlotFiles)))
 
-	glueTogether = lambda L: reduce(chain, L, [])
-	return glueTogether(map(partial(fileToTSCF, historicalData)
-						   , filterfalse(isHistoricalDataFile
-						   				, getExcelFiles(folder))))
 
 
+"""
+Historical data of a worker process, set once when the worker starts.
+"""
+_historicalData = None
 
+def _setHistoricalData(data):
+	global _historicalData
+	_historicalData = data
 
-def writeTSCF(folder):
+def _fileToEmissions(file):
+	return list(fileToEmissions(_historicalData, file))
+
+
+
+def writeTSCF(folder, workers=1, cacheDir=None):
 	"""
-	[String] folder => write an output csv in the folder.
+	[String] folder, [Int] workers, [String] cache folder => [String] full
+		path to the output csv in the folder, see folderToEmissions() for 
+		workers and cacheDir.
 	"""
-	headRows = [
-				 ['Upload Method', 'INCREMENTAL', '', '', '', '']
-			   , [ 'Field Id', 'Security Id Type', 'Security Id'
-			   	 , 'Account Code', 'Numeric Value', 'Char Value']
-			   ]
+	csvFile = join(folder, 'f3321tscf.historical.' + datetime.now().strftime('%Y%m%d') + '.inc')
+	writeUpload(csvFile, folderToEmissions(folder, workers, cacheDir))
+	return csvFile
 
-	writeCsv(join(folder, 'f3321tscf.historical.' + datetime.now().strftime('%Y%m%d') + '.inc')
-			, chain(headRows, folderToTSCF(folder)))
 
 
 
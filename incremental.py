@@ -0,0 +1,140 @@
+# coding=utf-8
+#
+# Process a folder of trustee files incrementally.
+#
+# Trustee files of a month do not arrive at the same time. Instead of
+# parsing every file in the folder on each run, a manifest file in the
+# folder keeps the size, modification time, content hash and records of
+# each file parsed before. On the next run, only new or changed files are
+# parsed, records of removed files are dropped, and the outputs are
+# written from the merged records.
+#
+# For example,
+#
+# writeTSCFIncremental(join(get_current_path(), 'trustee_reports'))
+#
+
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.report import getExcelFiles, writeTSCFFromRecords, \
+									writeHtmFromRecords
+from clamc_trustee.cache import fileHash, referenceKey
+from itertools import chain
+from os.path import join, basename
+import os, pickle
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+MANIFEST_FILE = 'trustee.manifest'
+
+
+
+def updateFolder(folder):
+	"""
+	[string] folder => [list] records, [dictionary] changes
+
+	Bring the manifest of the folder up to date and return the records of
+	all the files in the folder, in the order of getExcelFiles().
+
+	changes maps 'parsed', 'unchanged' and 'removed' to the list of file
+	names (without path) in each category.
+	"""
+	manifest = loadManifest(folder)
+	if manifest['reference'] != referenceKey():
+		logger.info('updateFolder(): parser changed, parse all files again')
+		manifest = {'reference': referenceKey(), 'files': {}}
+
+	oldEntries = manifest['files']
+	entries = {}
+	changes = {'parsed': [], 'unchanged': [], 'removed': []}
+	for file in getExcelFiles(folder):
+		name = basename(file)
+		entry, parsed = updateEntry(file, oldEntries.get(name))
+		changes['parsed' if parsed else 'unchanged'].append(name)
+		entries[name] = entry
+
+	changes['removed'] = sorted(set(oldEntries) - set(entries))
+	logger.info('updateFolder(): {0} parsed, {1} unchanged, {2} removed'.format(
+		len(changes['parsed']), len(changes['unchanged']), len(changes['removed'])))
+
+	if changes['removed'] != [] or \
+		any(entries[name] is not oldEntries.get(name) for name in entries):
+		saveManifest(folder, {'reference': manifest['reference'], 'files': entries})
+
+	return list(chain.from_iterable(entries[name]['records'] \
+				for name in sorted(entries))), changes
+
+
+
+def updateEntry(file, entry):
+	"""
+	[string] file, [dictionary] manifest entry of the file or None
+		=> [dictionary] manifest entry, [Bool] is the file parsed
+
+	If the size and modification time of the file are the same as in the
+	entry, the entry is returned as it is. Otherwise the content hash is
+	checked, and the file is parsed only if the hash has changed.
+	"""
+	stat = os.stat(file)
+	if entry is not None and (entry['size'], entry['mtime']) == \
+		(stat.st_size, stat.st_mtime):
+		return entry, False
+
+	h = fileHash(file)
+	if entry is not None and entry['hash'] == h:
+		return dict(entry, size=stat.st_size, mtime=stat.st_mtime), False
+
+	logger.info('updateEntry(): parse {0}'.format(file))
+	return { 'size': stat.st_size
+		   , 'mtime': stat.st_mtime
+		   , 'hash': h
+		   , 'records': fileToRecords(file)
+		   }, True
+
+
+
+def loadManifest(folder):
+	"""
+	[string] folder => [dictionary] manifest, an empty one if there is
+		no manifest file in the folder or it cannot be read.
+	"""
+	try:
+		with open(join(folder, MANIFEST_FILE), 'rb') as f:
+			return pickle.load(f)
+	except FileNotFoundError:
+		pass
+	except (pickle.UnpicklingError, EOFError):
+		logger.warning('loadManifest(): bad manifest file in {0}'.format(folder))
+
+	return {'reference': referenceKey(), 'files': {}}
+
+
+
+def saveManifest(folder, manifest):
+	temp = join(folder, MANIFEST_FILE + '.tmp')
+	with open(temp, 'wb') as f:
+		pickle.dump(manifest, f, pickle.HIGHEST_PROTOCOL)
+	os.replace(temp, join(folder, MANIFEST_FILE))
+
+
+
+def writeTSCFIncremental(folder):
+	"""
+	(string) folder => (string) full path to the TSCF upload file
+
+	Same as report.writeTSCF(), but only parse new or changed files.
+	"""
+	records, _ = updateFolder(folder)
+	return writeTSCFFromRecords(folder, records)
+
+
+
+def writeHtmIncremental(folder):
+	"""
+	(string) folder => (string) full path to the consolidated csv file
+
+	Same as report.writeHtmRecords(), but only parse new or changed files.
+	"""
+	records, _ = updateFolder(folder)
+	return writeHtmFromRecords(folder, records)
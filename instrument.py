@@ -0,0 +1,182 @@
+# coding=utf-8
+#
+# Per-stage timing and counters for the trustee file pipeline.
+#
+# Instrumentation is off by default. When it is off, stage() returns a
+# shared do-nothing object, so the instrumented code pays for little more
+# than a function call per stage. To collect statistics:
+#
+# with collect() as stats:
+# 	writeTSCF(folder)
+# stats.writeJson('stats.json')
+#
+# Statistics are kept per process, records parsed by worker processes (see
+# report.readFilesParallel()) are not counted.
+#
+
+from contextlib import contextmanager
+from time import perf_counter
+import json
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class Stats():
+	"""
+	Wall time, number of calls and counters (rows, sections, records,
+	etc.) of each stage, in total and per file.
+	"""
+	def __init__(self):
+		self.stages = {}	# stage => measurement
+		self.files = {}		# file => stage => measurement
+
+
+	def add(self, stage, file, seconds, counters):
+		measurements = [self.stages]
+		if file is not None:
+			measurements.append(self.files.setdefault(file, {}))
+
+		for m in measurements:
+			m = m.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+			m['calls'] += 1
+			m['seconds'] += seconds
+			for (name, value) in counters.items():
+				m[name] = m.get(name, 0) + value
+
+
+	def toDict(self):
+		return {'stages': self.stages, 'files': self.files}
+
+
+	def writeJson(self, fileName):
+		with open(fileName, 'w') as f:
+			json.dump(self.toDict(), f, indent=2)
+
+
+
+class Stage():
+	"""
+	A stage being measured, counters are added up until the stage ends.
+	"""
+	def __init__(self, stats, name, file):
+		self.stats = stats
+		self.name = name
+		self.file = file
+		self.counters = {}
+
+
+	def __enter__(self):
+		self.start = perf_counter()
+		return self
+
+
+	def __exit__(self, *args):
+		self.stats.add(self.name, self.file, perf_counter() - self.start, self.counters)
+		return False
+
+
+	def count(self, **counters):
+		for (name, value) in counters.items():
+			self.counters[name] = self.counters.get(name, 0) + value
+
+
+
+class NullStage():
+	"""
+	Used when instrumentation is off.
+	"""
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+	def count(self, **counters):
+		pass
+
+
+
+NULL_STAGE = NullStage()
+current = None		# the Stats object being collected, None if off
+
+
+
+def stage(name, file=None):
+	"""
+	[string] stage name, [string] file => a context manager that measures
+		the code inside it, see the example at the top.
+	"""
+	if current is None:
+		return NULL_STAGE
+
+	return Stage(current, name, file)
+
+
+
+def timed(iterable, name, file=None, counter='items'):
+	"""
+	[iterable] iterable, [string] stage name, [string] file, [string] counter
+		=> [iterable] the same items
+
+	Measure the time spent in getting the items out of a lazy iterable (a
+	generator), and count them as 'counter'. The stage is recorded when the
+	iterable is used up. Time spent in an inner iterable that is itself
+	timed is included.
+
+	When instrumentation is off, the iterable is returned as it is.
+	"""
+	if current is None:
+		return iterable
+
+	return timedItems(current, iterable, name, file, counter)
+
+
+
+def timedItems(stats, iterable, name, file, counter):
+	iterator = iter(iterable)
+	seconds, count = 0.0, 0
+	while True:
+		start = perf_counter()
+		try:
+			item = next(iterator)
+		except StopIteration:
+			break
+		finally:
+			seconds += perf_counter() - start
+
+		count += 1
+		yield item
+
+	stats.add(name, file, seconds, {counter: count})
+
+
+
+def enable(stats=None):
+	"""
+	[Stats] stats => [Stats] the object that collects statistics from now
+		on, a new one if stats is None.
+	"""
+	global current
+	current = Stats() if stats is None else stats
+	return current
+
+
+
+def disable():
+	global current
+	current = None
+
+
+
+@contextmanager
+def collect(stats=None):
+	"""
+	Collect statistics of the code inside the 'with' block.
+	"""
+	global current
+	previous = current
+	try:
+		yield enable(stats)
+	finally:
+		current = previous
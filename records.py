@@ -0,0 +1,170 @@
+# coding=utf-8
+#
+# Compact record types for positions read from trustee files.
+#
+# trustee.fileToRecords() gives each position as a dictionary, which costs
+# a hash table per position. The types here hold the same fields in slots,
+# one per header, and behave like a dictionary (record['quantity'],
+# record.keys(), etc.), so they can be passed to the existing functions
+# like recordsToRows() or consolidateRecords().
+#
+# For example,
+#
+# records = list(map(toCompactRecord, fileToRecords(file)))
+#
+
+from collections.abc import MutableMapping
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class Record(MutableMapping):
+	"""
+	Base class of the compact records.
+
+	A subclass has a fixed list of headers, in the same order as the keys
+	of the dictionary record from trustee.fileToRecords(). Only the headers
+	that are set show up in keys(), setting a header that is not in the
+	list raises KeyError.
+	"""
+	__slots__ = ()
+	headers = ()
+	slotOf = {}
+
+	def __init__(self, record=None):
+		if record is not None:
+			self.update(record)
+
+
+	def __getitem__(self, header):
+		try:
+			return getattr(self, self.slotOf[header])
+		except AttributeError:
+			raise KeyError(header)
+
+
+	def __setitem__(self, header, value):
+		try:
+			setattr(self, self.slotOf[header], value)
+		except KeyError:
+			logger.error('{0}: invalid header \'{1}\''.format(
+							type(self).__name__, header))
+			raise
+
+
+	def __delitem__(self, header):
+		try:
+			delattr(self, self.slotOf[header])
+		except AttributeError:
+			raise KeyError(header)
+
+
+	def __iter__(self):
+		return (h for h in self.headers if hasattr(self, self.slotOf[h]))
+
+
+	def __len__(self):
+		return sum(1 for _ in self)
+
+
+	def __contains__(self, header):
+		return header in self.slotOf and hasattr(self, self.slotOf[header])
+
+
+	def __repr__(self):
+		return '{0}({1})'.format(type(self).__name__, dict(self))
+
+
+	def toDict(self):
+		"""
+		=> [dictionary] a plain dictionary with the same keys and values
+		"""
+		return dict(self.items())
+
+
+
+def recordType(name, headers):
+	"""
+	[string] name, [tuple] headers => [class] a Record subclass with one
+		slot for each header.
+
+	A header like 'total cost HKD' is held in slot 'total_cost_HKD'.
+	"""
+	slotOf = {h: h.replace(' ', '_') for h in headers}
+	return type(name, (Record,), { '__slots__': tuple(slotOf.values())
+								 , 'headers': headers
+								 , 'slotOf': slotOf
+								 , '__module__': __name__
+								 })
+
+
+
+HtmBond = recordType('HtmBond', (
+	'description', 'currency', 'quantity', 'coupon', 'interest start day',
+	'maturity', 'average cost', 'amortized cost', 'total cost',
+	'accrued interest', 'total amortized cost', 'total amortized gain loss',
+	'total cost HKD', 'accrued interest HKD', 'total amortized cost HKD',
+	'total amortized gain loss HKD', 'FX gain loss HKD', 'percentage of fund',
+	'type', 'accounting', 'isin', 'portfolio', 'valuation date'))
+
+
+
+# bonds at market value, i.e., available for sales or held for trading
+AfsBond = recordType('AfsBond', (
+	'description', 'currency', 'quantity', 'coupon', 'interest start day',
+	'maturity', 'average cost', 'market price', 'total cost',
+	'accrued interest', 'total market value', 'market value gain loss',
+	'total cost HKD', 'accrued interest HKD', 'total market value HKD',
+	'market value gain loss HKD', 'FX gain loss HKD', 'percentage of fund',
+	'type', 'accounting', 'isin', 'portfolio', 'valuation date'))
+
+
+
+Equity = recordType('Equity', (
+	'description', 'currency', 'quantity', 'last trade day', 'average cost',
+	'market price', 'total cost', 'accrued dividend', 'total market value',
+	'market value gain loss', 'total cost HKD', 'accrued dividend HKD',
+	'total market value HKD', 'market value gain loss HKD',
+	'FX gain loss HKD', 'percentage of fund', 'type', 'accounting', 'ticker',
+	'portfolio', 'valuation date'))
+
+
+
+Cash = recordType('Cash', (
+	'description', 'currency', 'average FX rate', 'portfolio FX rate',
+	'total cost', 'accrued interest', 'total market value', 'total cost HKD',
+	'accrued interest HKD', 'total market value HKD', 'FX gain loss HKD',
+	'percentage of fund', 'type', 'accounting', 'portfolio',
+	'valuation date'))
+
+
+
+def recordClass(record):
+	"""
+	[dictionary] record => [class] the compact record type for the record,
+		None if there is none.
+	"""
+	if record['type'] == 'bond':
+		return HtmBond if record['accounting'] == 'htm' else AfsBond
+	elif record['type'] == 'equity':
+		return Equity
+	elif record['type'] == 'cash':
+		return Cash
+	else:
+		return None
+
+
+
+def toCompactRecord(record):
+	"""
+	[dictionary] record => [Record] compact record
+
+	If the record does not fit any of the compact types, e.g., it has a
+	header not known to the type, the record is returned as it is.
+	"""
+	compactType = recordClass(record)
+	if compactType is None or not all(h in compactType.slotOf for h in record):
+		return record
+
+	return compactType(record)
@@ -4,9 +4,13 @@
 # we need.
 #
 
-from clamc_trustee.trustee import fileToRecords, groupToRecord, \
+from clamc_trustee.trustee import fileToRecords, iterFileRecords, \
 									writeCsv, recordsToRows
-from functools import reduce
+from clamc_trustee.aggregate import groupIds, aggregateGroups
+from clamc_trustee.instrument import stage
+from clamc_trustee.tscf import writeUpload, recordEmissions, readUpload, \
+								DeltaFilter
+from itertools import chain
 from os.path import join
 import logging
 logger = logging.getLogger(__name__)
@@ -15,10 +19,11 @@ logger = logging.getLogger(__name__)
 
 def consolidateRecords(records):
 	"""
-	records => records
+	records => [list] records
 
 	Consolidate records from muotiple portfolios, so that records of the 
-	same security are combined into one record.
+	same security (see securityKey()) are combined into one record, see
+	aggregate.HOLDING_RULES.
 	"""
 	def toNewRecords(record):
 		"""
@@ -34,46 +39,110 @@ def consolidateRecords(records):
 		return r
 	# end of toNewRecords()
 
-	return map(groupToRecord, recordsToGroups(map(toNewRecords, records)))
+	records = list(map(toNewRecords, records))
+	with stage('groupIds') as s:
+		ids, count = groupIds(records, securityKey)
+		s.count(groups=count, merged=len(records)-count)
 
+	return aggregateGroups(records, ids, count)
 
 
-def recordsToGroups(records):
-	"""
-	[iterable] records => [list] groups
 
-	Group a list of records into a list of sub groups, based on the record's
-	description. Records with the same description are put into one sub
-	group.
+def securityKey(record):
 	"""
-	def addToGroup(groups, record):
-		temp = [g for g in groups if g[0]['description'] == record['description']]
-		assert len(temp) < 2, 'addToGroup(): too many groups {0}'.format(len(temp))
-		if temp == []:
-			groups.append([record])	# create new group
-		elif (len(temp) == 1):
-			temp[0].append(record)	# add to existing group
+	[dictionary] record => [string] key of the security
 
-		return groups
+	The key is the ISIN of the record, or the description if there is no 
+	ISIN (e.g., cash). Case and extra spaces are ignored.
+	"""
+	key = record.get('isin', '')
+	if key == '':
+		key = record['description']
 
-	return reduce(addToGroup, records, [])
+	return ' '.join(key.split()).upper()
 
 
 
-def readFiles(folder):
+def readFiles(folder, reader=iterFileRecords):
 	"""
 	[string] folder => [list] records
 
 	Read all the files in a folder and return a list of records from 
 	those files.
+
+	reader: the function to read records from a file, e.g., 
+		cache.RecordCache.iterFileRecords to use cached records.
 	"""
-	return reduce(lambda x,y: x+y, map(fileToRecords, getExcelFiles(folder)), [])
+	with stage('readFiles') as s:
+		records = list(iterFiles(folder, reader))
+		s.count(records=len(records))
+
+	return records
+
+
+
+def iterFiles(folder, reader=iterFileRecords):
+	"""
+	[string] folder => [iterable] records
+
+	Same as readFiles(), but records are read lazily, one file at a time.
+	"""
+	return chain.from_iterable(map(reader, getExcelFiles(folder)))
+
+
+
+def readFilesParallel(folder, workers=None, reader=fileToRecords):
+	"""
+	[string] folder, [int] workers => [list] records, [list] errors
+
+	Same as readFiles(), but the files are parsed by a pool of worker 
+	processes. workers is the size of the pool, None means one worker per 
+	CPU core.
+
+	Records are returned in the same order as the files in getExcelFiles(),
+	no matter which worker finishes first. A file that fails to parse does 
+	not stop the rest of the batch, instead it goes into the errors list as 
+	a (file, error message) tuple.
+
+	reader: see readFiles(), it must be a function that can be sent to 
+		another process.
+	"""
+	from concurrent.futures import ProcessPoolExecutor
+	from functools import partial
+
+	records = []
+	errors = []
+	files = getExcelFiles(folder)
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for (file, (fileRecords, error)) in \
+			zip(files, executor.map(partial(_safeFileToRecords, reader), files)):
+			if error is None:
+				records.extend(fileRecords)
+			else:
+				logger.error('readFilesParallel(): {0}: {1}'.format(file, error))
+				errors.append((file, error))
+
+	return records, errors
+
+
+
+def _safeFileToRecords(reader, file):
+	"""
+	[function] reader, [string] file => [list] records, [string] error message
+
+	Run in a worker process, the exception is turned into a message so 
+	that it can be sent back to the parent process.
+	"""
+	try:
+		return list(reader(file)), None
+	except Exception as e:
+		return [], '{0}: {1}'.format(type(e).__name__, e)
 
 
 
 def getExcelFiles(folder):
 	"""
-	[string] folder => [list] excel files in folder
+	[string] folder => [list] excel files in folder, sorted by file name
 	"""
 	from os import listdir
 	from os.path import isfile
@@ -84,7 +153,7 @@ def getExcelFiles(folder):
 		"""
 		return file.split('.')[-1] in ('xls', 'xlsx')
 
-	return [join(folder, f) for f in listdir(folder) \
+	return [join(folder, f) for f in sorted(listdir(folder)) \
 			if isfile(join(folder, f)) and isExcelFile(f)]
 
 
@@ -96,7 +165,7 @@ def htmBond(record):
 
 
 
-def writeHtmRecords(folder):
+def writeHtmRecords(folder, reader=iterFileRecords):
 	"""
 	(string) folder => (string) full path to a csv file
 	side effect: create a csv file in that folder.
@@ -104,14 +173,26 @@ def writeHtmRecords(folder):
 	Read files in folder and write a consolidated report for all HTM bonds 
 	from those files into a csv.
 	"""
-	records = list(consolidateRecords(filter(htmBond, readFiles(folder))))
+	return writeHtmFromRecords(folder, iterFiles(folder, reader))
+
+
+
+def writeHtmFromRecords(folder, records):
+	"""
+	(string) folder, (iterable) records => (string) full path to a csv file
+	side effect: create a csv file in that folder.
+
+	Same as writeHtmRecords(), but use the given records instead of reading
+	the files.
+	"""
+	records = list(consolidateRecords(filter(htmBond, records)))
 	csvFile = join(folder, 'htm bond consolidated.csv')
 	writeCsv(csvFile, recordsToRows(records))
 	return csvFile
 
 
 
-def writeTSCF(folder):
+def writeTSCF(folder, reader=iterFileRecords, previousFile=None, tolerance=0):
 	"""
 	(string) folder => (string) full path to a csv file
 	side effect: create a csv file in that folder.
@@ -128,21 +209,61 @@ def writeTSCF(folder):
 	CD012,4,XS1556937891,12734,98.89,98.89
 	...
 
+	If previousFile (the full upload of the last run) is given, only rows
+	added or changed by more than tolerance since then are uploaded, see
+	writeTSCFFromRecords().
 	"""
-	def toTSCFRow(record):
-		"""
-		[dictionary] record => [list] items in a row of the TSCF file 
-		"""
-		return ['CD012', 4, record['isin'], record['portfolio'], 
-					record['amortized cost'], record['amortized cost']]
-
-	records = readFiles(folder)
-	csvFile = join(folder, 'f3321tscf.htm.' + records[0]['valuation date'] + '.inc')
-	writeCsv(csvFile, [['Upload Method', 'INCREMENTAL', '', '', '', ''],
-				['Field Id', 'Security Id Type', 'Security Id', 'Account Code',
-				'Numeric Value', 'Char Value']] + \
-				list(map(toTSCFRow, filter(htmBond, records))))
-	return csvFile
+	return writeTSCFFromRecords(folder, iterFiles(folder, reader), previousFile,
+								tolerance)
+
+
+
+def writeTSCFFromRecords(folder, records, previousFile=None, tolerance=0):
+	"""
+	(string) folder, (iterable) records, (string) previous full upload
+	file, (float) tolerance => (string) full path to the csv file to upload
+	side effect: create csv files in that folder.
+
+	Same as writeTSCF(), but use the given records instead of reading the
+	files.
+
+	Without a previous file, the upload has all the rows, named like
+	'f3321tscf.htm.2018-04-30.inc'. With a previous file, 3 files are
+	written, named like:
+
+	'f3321tscf.htm.2018-04-30.full.inc': all the rows, not to be uploaded
+		but to be the previous file of the next run,
+	'f3321tscf.htm.2018-04-30.delta.inc': the upload, rows added or changed
+		since the previous file (see tscf.DeltaFilter),
+	'f3321tscf.htm.2018-04-30.summary.csv': the rows held back.
+
+	The previous file must hold all the rows of the last run (a full or
+	first upload, not a delta), otherwise rows left out of it come back as
+	added. It can be the full upload of the same month, to upload only the
+	rows corrected since.
+	"""
+	records = iter(records)
+	try:
+		first = next(records)	# valuation date goes into the file name
+	except StopIteration:
+		logger.error('writeTSCFFromRecords(): no records in {0}'.format(folder))
+		raise ValueError
+	prefix = join(folder, 'f3321tscf.htm.' + first['valuation date'])
+	emissions = recordEmissions(filter(htmBond, chain([first], records))
+								, [('CD012', 'amortized cost')])
+	if previousFile is None:
+		writeUpload(prefix + '.inc', emissions)
+		return prefix + '.inc'
+
+	# read the previous file first, re-running a month against its own
+	# full upload would otherwise compare the rows with themselves
+	delta = DeltaFilter(readUpload(previousFile), tolerance)
+	emissions = list(emissions)		# one per HTM position, goes to 2 files
+	writeUpload(prefix + '.full.inc', emissions)
+	writeUpload(prefix + '.delta.inc', delta(emissions))
+	delta.writeSummary(prefix + '.summary.csv')
+	logger.info('writeTSCFFromRecords(): {0}'.format(delta.counts))
+	return prefix + '.delta.inc'
 
 
 
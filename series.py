@@ -0,0 +1,280 @@
+# coding=utf-8
+#
+# Monthly time series of HTM bond amortized cost per (portfolio, ISIN).
+#
+# Each month's trustee records are added to an index, which keeps for every
+# (portfolio, ISIN) the valuation dates (as day numbers), amortized cost,
+# quantity and total amortized cost in arrays sorted by date. Lookups use
+# bisect on the day numbers, so as-of and range queries do not depend on
+# how many months there are. When saved, the day numbers are delta encoded
+# (days since the previous point).
+#
+# For example,
+#
+# index = SeriesIndex.load('amortized cost.series')
+# index.addRecords(readFiles(join(get_current_path(), 'trustee_reports')))
+# index.asOf('12229', 'HK0000171949', '2018-06-15')
+# index.changes('2018-04-30', '2018-05-31')
+# index.save('amortized cost.series')
+#
+
+from clamc_trustee.report import htmBond
+from collections import namedtuple
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import os, pickle
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+Point = namedtuple('Point', ['date', 'amortized_cost', 'quantity', 'total_amortized_cost'])
+
+Change = namedtuple('Change', ['portfolio', 'isin', 'before', 'after'])
+
+VERSION = 1
+
+
+
+def toDay(valuationDate):
+	"""
+	[string] 'yyyy-mm-dd' => [int] day number (date.toordinal())
+	"""
+	return date(int(valuationDate[:4]), int(valuationDate[5:7]),
+				int(valuationDate[8:10])).toordinal()
+
+
+
+def fromDay(day):
+	return date.fromordinal(day).isoformat()
+
+
+
+class Series():
+	"""
+	Points of one (portfolio, ISIN), sorted by day.
+	"""
+	def __init__(self):
+		self.days = array('i')
+		self.costs = array('d')
+		self.quantities = array('d')
+		self.totals = array('d')
+
+
+	def __len__(self):
+		return len(self.days)
+
+
+	def add(self, day, cost, quantity, total):
+		"""
+		Add a point, or replace the point of the same day.
+		"""
+		if len(self.days) == 0 or day > self.days[-1]:	# the usual case
+			i = len(self.days)
+		else:
+			i = bisect_left(self.days, day)
+			if self.days[i] == day:
+				self.costs[i], self.quantities[i], self.totals[i] = cost, quantity, total
+				return
+
+		self.days.insert(i, day)
+		self.costs.insert(i, cost)
+		self.quantities.insert(i, quantity)
+		self.totals.insert(i, total)
+
+
+	def remove(self, day):
+		"""
+		Remove the point of that day, if there is one.
+		"""
+		i = bisect_left(self.days, day)
+		if i < len(self.days) and self.days[i] == day:
+			for values in (self.days, self.costs, self.quantities, self.totals):
+				values.pop(i)
+
+
+	def point(self, i):
+		return Point(fromDay(self.days[i]), self.costs[i], self.quantities[i], self.totals[i])
+
+
+	def at(self, day):
+		"""
+		[int] day => [Point] on that day, or None.
+		"""
+		i = bisect_left(self.days, day)
+		return self.point(i) if i < len(self.days) and self.days[i] == day else None
+
+
+	def asOf(self, day):
+		"""
+		[int] day => [Point] the latest on or before that day, or None.
+		"""
+		i = bisect_right(self.days, day)
+		return self.point(i-1) if i > 0 else None
+
+
+	def between(self, start, end):
+		"""
+		[int] start, [int] end => [list] points from start to end, inclusive.
+		"""
+		return [self.point(i) for i in range(bisect_left(self.days, start),
+											bisect_right(self.days, end))]
+
+
+	def encode(self):
+		"""
+		=> [tuple] bytes of the delta encoded days and of the values.
+		"""
+		deltas = array('i', (d - p for (d, p) in zip(self.days, [0] + list(self.days))))
+		return (deltas.tobytes(), self.costs.tobytes(), self.quantities.tobytes(),
+				self.totals.tobytes())
+
+
+	@staticmethod
+	def decode(encoded):
+		s = Series()
+		deltas = array('i')
+		deltas.frombytes(encoded[0])
+		day = 0
+		for d in deltas:
+			day = day + d
+			s.days.append(day)
+
+		for (values, data) in zip((s.costs, s.quantities, s.totals), encoded[1:]):
+			values.frombytes(data)
+
+		return s
+
+
+
+class SeriesIndex():
+	"""
+	Series of amortized cost, quantity and total amortized cost, by
+	(portfolio, ISIN).
+	"""
+	def __init__(self):
+		self.series = {}	# (portfolio, isin) => Series
+		self.days = set()	# all valuation dates added
+
+
+	def __len__(self):
+		return len(self.series)
+
+
+	def addRecords(self, records):
+		"""
+		[iterable] records => [int] number of HTM bond records added
+
+		Records other than HTM bonds are ignored. Adding the records of a
+		month again replaces all that month's points: positions that are
+		not in the new records are gone from that month. So the records of
+		a month (all portfolios) must be added together.
+		"""
+		records = list(filter(htmBond, records))
+		days = set(toDay(record['valuation date']) for record in records)
+		for key in list(self.series):
+			s = self.series[key]
+			for day in days:
+				s.remove(day)
+			if len(s) == 0:
+				del self.series[key]
+
+		for record in records:
+			key = (record['portfolio'], record['isin'])
+			try:
+				s = self.series[key]
+			except KeyError:
+				s = self.series[key] = Series()
+
+			s.add(toDay(record['valuation date']), record['amortized cost'],
+					record['quantity'], record['total amortized cost'])
+
+		self.days.update(days)
+		return len(records)
+
+
+	def valuationDates(self):
+		return [fromDay(day) for day in sorted(self.days)]
+
+
+	def asOf(self, portfolio, isin, valuationDate):
+		"""
+		=> [Point] the latest point on or before the date, None if there
+			is none.
+		"""
+		try:
+			return self.series[(portfolio, isin)].asOf(toDay(valuationDate))
+		except KeyError:
+			return None
+
+
+	def range(self, portfolio, isin, start=None, end=None):
+		"""
+		=> [list] points from start to end ('yyyy-mm-dd', inclusive, either
+			can be None for no limit).
+		"""
+		try:
+			s = self.series[(portfolio, isin)]
+		except KeyError:
+			return []
+
+		return s.between(toDay(start) if start else 0,
+						 toDay(end) if end else date.max.toordinal())
+
+
+	def changes(self, before, after, tolerance=0):
+		"""
+		[string] valuation date before, [string] valuation date after,
+		[float] tolerance => [list] Changes, by portfolio and ISIN
+
+		A position changes if its amortized cost or quantity moves by more
+		than tolerance, or if it is there on one date but not the other (the
+		missing point is None).
+		"""
+		dayBefore, dayAfter = toDay(before), toDay(after)
+		changes = []
+		for key in sorted(self.series):
+			s = self.series[key]
+			p1, p2 = s.at(dayBefore), s.at(dayAfter)
+			if p1 is None and p2 is None:
+				continue
+			if p1 is None or p2 is None or \
+				abs(p1.amortized_cost - p2.amortized_cost) > tolerance or \
+				abs(p1.quantity - p2.quantity) > tolerance:
+				changes.append(Change(key[0], key[1], p1, p2))
+
+		return changes
+
+
+	def save(self, fileName):
+		data = { 'version': VERSION
+			   , 'series': {key: s.encode() for (key, s) in self.series.items()}
+			   }
+		with open(fileName + '.tmp', 'wb') as f:
+			pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(fileName + '.tmp', fileName)
+
+
+	@staticmethod
+	def load(fileName):
+		"""
+		[string] file name => [SeriesIndex] saved in the file, an empty one
+			if the file does not exist.
+		"""
+		index = SeriesIndex()
+		try:
+			with open(fileName, 'rb') as f:
+				data = pickle.load(f)
+		except FileNotFoundError:
+			return index
+
+		if data['version'] != VERSION:
+			logger.error('load(): unknown version {0}'.format(data['version']))
+			raise ValueError
+
+		for (key, encoded) in data['series'].items():
+			s = index.series[key] = Series.decode(encoded)
+			index.days.update(s.days)
+
+		return index
@@ -0,0 +1,257 @@
+# coding=utf-8
+#
+# A long running service that keeps parsed trustee files in memory.
+#
+# Started once, it answers requests from several users over HTTP on
+# localhost, so that a request does not pay for starting Python, importing
+# the modules and parsing the files again. Records of a file are kept until
+# the file changes (size or modification time), consolidated records of a
+# folder until one of its files changes.
+#
+# Requests are json posted to one of the paths below, the reply is json:
+#
+# /parse		{"file": ...} => {"records": [...]}
+# /consolidate	{"folder": ...} => {"records": [...]}, HTM bonds consolidated
+# /tscf			{"folder": ..., "previousFile": ..., "tolerance": ...}
+#					=> {"file": ...}, see report.writeTSCFFromRecords(),
+#					previousFile is the full file of the last run
+# /historical	{"folder": ...} => {"file": ...}, see hcost.writeTSCF()
+#
+# and GET /status gives the number of files and folders cached. To start
+# the service:
+#
+# python service.py --port 8642
+#
+# and to use it from Python:
+#
+# request('/consolidate', {'folder': folder})
+#
+
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.report import getExcelFiles, consolidateRecords, htmBond, \
+									writeTSCFFromRecords
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from itertools import chain
+import json, os, threading, time
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+DEFAULT_PORT = 8642
+
+
+
+class WarmCache():
+	"""
+	Records of files and consolidated records of folders, in memory.
+
+	Records handed out are shared between requests and must not be changed.
+	Several threads can use the cache at the same time: the lock guards the
+	dictionaries only, files are parsed outside it.
+	"""
+	def __init__(self, reader=fileToRecords):
+		self.reader = reader
+		self.files = {}		# file => (size, mtime), records
+		self.folders = {}	# folder => file keys, consolidated records
+		self.lock = threading.Lock()
+
+
+	def fileToRecords(self, file):
+		"""
+		[string] file => [list] records of the file, parsed again only if
+			the file has changed.
+		"""
+		key = fileKey(file)
+		with self.lock:
+			entry = self.files.get(file)
+		if entry is not None and entry[0] == key:
+			return entry[1]
+
+		records = self.reader(file)
+		with self.lock:
+			self.files[file] = (key, records)
+		return records
+
+
+	def folderRecords(self, folder):
+		"""
+		[string] folder => [list] records of all the files in the folder
+		"""
+		return list(chain.from_iterable(map(self.fileToRecords, getExcelFiles(folder))))
+
+
+	def consolidated(self, folder):
+		"""
+		[string] folder => [list] HTM bond records of the folder, consolidated
+		"""
+		files = getExcelFiles(folder)
+		keys = [(file, fileKey(file)) for file in files]
+		with self.lock:
+			entry = self.folders.get(folder)
+		if entry is not None and entry[0] == keys:
+			return entry[1]
+
+		records = list(consolidateRecords(filter(htmBond,
+						chain.from_iterable(map(self.fileToRecords, files)))))
+		with self.lock:
+			self.folders[folder] = (keys, records)
+		return records
+
+
+	def status(self):
+		with self.lock:
+			return {'files': len(self.files), 'folders': len(self.folders)}
+
+
+
+def fileKey(file):
+	stat = os.stat(file)
+	return (stat.st_size, stat.st_mtime)
+
+
+
+class BadRequest(Exception):
+	pass
+
+
+
+def required(request, name):
+	try:
+		return request[name]
+	except KeyError:
+		raise BadRequest('missing parameter \'{0}\''.format(name))
+
+
+
+def handleParse(cache, request):
+	return {'records': cache.fileToRecords(required(request, 'file'))}
+
+
+
+def handleConsolidate(cache, request):
+	return {'records': cache.consolidated(required(request, 'folder'))}
+
+
+
+def handleTSCF(cache, request):
+	folder = required(request, 'folder')
+	return {'file': writeTSCFFromRecords(folder, cache.folderRecords(folder)
+										, request.get('previousFile')
+										, request.get('tolerance', 0))}
+
+
+
+def handleHistorical(cache, request):
+	from clamc_trustee.hcost import writeTSCF
+	return {'file': writeTSCF(required(request, 'folder'))}
+
+
+
+HANDLERS = { '/parse': handleParse
+		   , '/consolidate': handleConsolidate
+		   , '/tscf': handleTSCF
+		   , '/historical': handleHistorical
+		   }
+
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+	"""
+	Turn a json request into a call to one of the HANDLERS. A bad request
+	(not json, missing parameter) gives status 400, a failure in the
+	handler 500, in both cases the reply has the error message.
+	"""
+	def do_GET(self):
+		if self.path == '/status':
+			self.reply(200, self.server.cache.status())
+		else:
+			self.reply(404, {'error': 'unknown path {0}'.format(self.path)})
+
+
+	def do_POST(self):
+		try:
+			handler = HANDLERS[self.path]
+		except KeyError:
+			self.reply(404, {'error': 'unknown path {0}'.format(self.path)})
+			return
+
+		start = time.perf_counter()
+		try:
+			length = int(self.headers.get('Content-Length', 0))
+			request = json.loads(self.rfile.read(length) or b'{}')
+			result = handler(self.server.cache, request)
+		except (BadRequest, json.JSONDecodeError) as e:
+			self.reply(400, {'error': str(e)})
+			return
+		except Exception as e:
+			logger.exception('do_POST(): {0}'.format(self.path))
+			self.reply(500, {'error': '{0}: {1}'.format(type(e).__name__, e)})
+			return
+
+		result['seconds'] = time.perf_counter() - start
+		self.reply(200, result)
+
+
+	def reply(self, status, result):
+		body = json.dumps(result).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+	def log_message(self, format, *args):
+		logger.debug('{0} {1}'.format(self.address_string(), format % args))
+
+
+
+def makeServer(port=DEFAULT_PORT, cache=None):
+	"""
+	[int] port, [WarmCache] cache => [ThreadingHTTPServer] listening on
+		localhost only, each request is handled in its own thread. Port 0
+		picks a free port, see server.server_address.
+	"""
+	server = ThreadingHTTPServer(('127.0.0.1', port), RequestHandler)
+	server.daemon_threads = True
+	server.cache = WarmCache() if cache is None else cache
+	return server
+
+
+
+def request(path, parameters=None, port=DEFAULT_PORT, timeout=600):
+	"""
+	[string] path, [dictionary] parameters, [int] port => [dictionary] reply
+
+	Send a request to the service, raise ValueError with the error message
+	if it fails.
+	"""
+	from urllib.request import urlopen, Request
+	from urllib.error import HTTPError
+	url = 'http://127.0.0.1:{0}{1}'.format(port, path)
+	data = None if parameters is None else json.dumps(parameters).encode('utf-8')
+	try:
+		with urlopen(Request(url, data, {'Content-Type': 'application/json'})
+					, timeout=timeout) as r:
+			return json.loads(r.read())
+	except HTTPError as e:
+		raise ValueError(json.loads(e.read())['error'])
+
+
+
+if __name__ == '__main__':
+	import argparse, logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+	parser = argparse.ArgumentParser(description='Serve trustee reports from memory')
+	parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+	args = parser.parse_args()
+
+	server = makeServer(args.port)
+	print('listening on 127.0.0.1:{0}'.format(server.server_address[1]))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
@@ -0,0 +1,302 @@
+# coding=utf-8
+#
+# Read the rows of an xlrd worksheet into lines (lists of cell values).
+#
+# Instead of calling cell_value() on each cell, whole rows are taken from
+# the sheet at once, and the cell type information kept by xlrd is used to
+# find blank rows and empty trailing columns without looking at the values.
+#
+# fileRows() reads an .xlsx file with the streaming reader in xlsx.py
+# instead, without loading the workbook. Other workbooks are opened by
+# loadSheet(), which parses only the sheet asked for.
+#
+# xlrd is imported when the first workbook is opened, so that modules using
+# this one (trustee.py, hcost.py) start quickly and do not load it at all
+# if they only read .xlsx files.
+#
+# A sheet loaded by fileRows() is released as soon as its last row is read.
+# Lines that are kept can be made compact, see SparseLine.
+#
+
+from clamc_trustee.xlsx import isXlsx, xlsxRows, xlsxDatemode
+from clamc_trustee.instrument import stage
+from contextlib import contextmanager
+from array import array
+from bisect import bisect_left
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# xlrd cell types (xlrd.XL_CELL_EMPTY, etc.)
+XL_CELL_EMPTY, XL_CELL_TEXT, XL_CELL_BLANK = 0, 1, 6
+
+# cell types that hold nothing, as bytes so that they can be stripped
+# from the row types in one call.
+EMPTY_TYPES = bytes([XL_CELL_EMPTY, XL_CELL_BLANK])
+
+
+
+def fileRows(fileName, skipBlank=False, sheet=0):
+	"""
+	[string] file, [Bool] skipBlank, [int or string] sheet index or name
+		=> [generator] lines of the sheet
+
+	An .xlsx file is streamed (see xlsx.py), lines have the same values as
+	with xlrd, though they may have some extra empty columns at the right.
+	Other files are loaded by loadSheet().
+	"""
+	return workbookRows(fileName, skipBlank, sheet)[0]
+
+
+
+def workbookRows(fileName, skipBlank=False, sheet=0):
+	"""
+	[string] file, [Bool] skipBlank, [int or string] sheet index or name
+		=> [generator] lines of the sheet, [int] date mode of the workbook
+		(0 for 1900 based dates, 1 for 1904 based, like xlrd's
+		Book.datemode)
+	"""
+	if isXlsx(fileName):
+		return streamRows(xlsxRows(fileName, sheet), skipBlank), xlsxDatemode(fileName)
+
+	with stage('openWorkbook', fileName):
+		ws = loadSheet(fileName, sheet)
+
+	return sheetRows(ws, skipBlank, True), ws.book.datemode
+
+
+
+def loadSheet(fileName, sheet=0):
+	"""
+	[string] file, [int or string] sheet index or name => [xlrd sheet]
+
+	The file is memory mapped instead of read into a buffer, only the sheet
+	asked for is parsed, and the workbook's resources (the mapped file,
+	shared strings) are released as soon as it is loaded. The sheet keeps
+	its cells.
+	"""
+	with openWorkbook(fileName) as wb:
+		return wb.sheet_by_name(sheet) if isinstance(sheet, str) \
+				else wb.sheet_by_index(sheet)
+
+
+
+@contextmanager
+def openWorkbook(fileName):
+	"""
+	[string] file => [xlrd book] opened on demand and memory mapped, its
+		resources are released when the 'with' block exits, even on error.
+		Sheets loaded inside the block can be used after it.
+	"""
+	from xlrd import open_workbook
+	wb = open_workbook(filename=fileName, on_demand=True, use_mmap=True)
+	try:
+		yield wb
+	finally:
+		wb.release_resources()
+
+
+
+def streamRows(lines, skipBlank):
+	for line in lines:
+		if skipBlank and isBlankLine(line):
+			continue
+
+		yield [v.replace('\n', ' ') if isinstance(v, str) else v for v in line]
+
+
+
+def sheetToLines(ws, skipBlank=False):
+	"""
+	[xlrd sheet] ws, [Bool] skipBlank => [list] lines
+
+	Each line is a list of values of a row in the sheet, line breaks in text
+	are replaced by spaces. Columns at the right end of the sheet that are
+	empty in every row are dropped, all lines have the same length.
+
+	If skipBlank is True, rows that are blank (see isBlankRow()) are left
+	out.
+	"""
+	return list(sheetRows(ws, skipBlank))
+
+
+
+def sheetRows(ws, skipBlank=False, release=False):
+	"""
+	[xlrd sheet] ws, [Bool] skipBlank, [Bool] release => [generator] lines
+
+	Same lines as sheetToLines(), one at a time. If release is True, the
+	sheet and its workbook are released (see releaseSheet()) when the
+	generator finishes or is closed.
+	"""
+	try:
+		ncols = usedColumns(ws)
+		for row in range(ws.nrows):
+			types = ws.row_types(row, 0, ncols)
+			if skipBlank and isBlankRow(ws, row, types):
+				continue
+
+			values = ws.row_values(row, 0, ncols)
+			if XL_CELL_TEXT in types:
+				values = [v.replace('\n', ' ') if t == XL_CELL_TEXT else v \
+							for (v, t) in zip(values, types)]
+			yield values
+	finally:
+		if release:
+			releaseSheet(ws)
+
+
+
+def releaseSheet(ws):
+	"""
+	[xlrd sheet] ws => unload the sheet from its workbook and release the
+		workbook's resources.
+
+	A sheet and its workbook refer to each other, and the sheet to itself
+	(xlrd keeps its bound put_cell() method as an attribute), so the cells
+	would stay in memory until the garbage collector finds the cycle, which
+	may be after several more files are loaded. Both references are dropped
+	here, the cells then go as soon as the caller lets go of the sheet.
+	Neither the sheet nor the workbook can be used afterwards.
+	"""
+	book = ws.book
+	book.unload_sheet(ws.number)
+	book.release_resources()
+	ws.book = None
+	ws.put_cell = None
+
+
+
+def usedColumns(ws):
+	"""
+	[xlrd sheet] ws => [int] number of columns up to the last column that
+		is not empty in at least one row.
+	"""
+	ncols = 0
+	for row in range(ws.nrows):
+		ncols = max(ncols, len(ws.row_types(row).tobytes().rstrip(EMPTY_TYPES)))
+
+	return ncols
+
+
+
+def isBlankRow(ws, row, types, width=20):
+	"""
+	[xlrd sheet] ws, [int] row, [array] types of the row, [int] width
+		=> [Bool] is the row blank
+
+	A row is blank if its first 'width' cells are empty, or hold only text
+	made of white spaces. Only rows with text cells need to look at the
+	values.
+	"""
+	nonEmpty = types[:width].tobytes().translate(None, EMPTY_TYPES)
+	if nonEmpty == b'':
+		return True
+	if nonEmpty.strip(bytes([XL_CELL_TEXT])) != b'':
+		return False	# there is a number, date, etc.
+
+	return all(v.strip() == '' for (v, t) in \
+				zip(ws.row_values(row, 0, width), types) if t == XL_CELL_TEXT)
+
+
+
+def isBlankLine(line, width=20):
+	"""
+	[list] line, [int] width => [Bool] is the line blank, same as isBlankRow()
+		for a line that is already read.
+	"""
+	return all(isinstance(v, str) and v.strip() == '' for v in line[:width])
+
+
+
+class SparseLine():
+	"""
+	A line that keeps only its non empty cells, for lines that are held in
+	memory, e.g., trustee.fileToLines(fileName, compact=True).
+
+	It reads like the list it comes from: len(), indexing (an empty cell
+	is ''), slicing (gives a list), iteration and comparison with lists.
+	"""
+	__slots__ = ('width', 'columns', 'values')
+
+	def __init__(self, line, values=None):
+		"""
+		[list] line, [dictionary] values => a compact line
+
+		values: a table shared by lines of the same file, so that text and
+			numbers repeated in many lines (currency, headers, dates) are
+			kept once, see shared().
+		"""
+		columns = [i for (i, v) in enumerate(line) if v != '']
+		self.width = len(line)
+		self.columns = bytes(columns) if self.width <= 256 else array('H', columns)
+		self.values = tuple(line[i] for i in columns) if values is None else \
+						tuple(shared(values, line[i]) for i in columns)
+
+
+	def __len__(self):
+		return self.width
+
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return self.toList()[index]
+
+		if index < 0:
+			index = index + self.width
+		if index < 0 or index >= self.width:
+			raise IndexError('line index out of range')
+		i = bisect_left(self.columns, index)
+		if i < len(self.columns) and self.columns[i] == index:
+			return self.values[i]
+		return ''
+
+
+	def __iter__(self):
+		return iter(self.toList())
+
+
+	def __eq__(self, other):
+		if isinstance(other, (list, SparseLine)):
+			return self.toList() == list(other)
+		return NotImplemented
+
+
+	__hash__ = None
+
+
+	def __repr__(self):
+		return 'SparseLine({0!r})'.format(self.toList())
+
+
+	def toList(self):
+		line = [''] * self.width
+		for (i, v) in zip(self.columns, self.values):
+			line[i] = v
+
+		return line
+
+
+
+def shared(values, value):
+	"""
+	[dictionary] values, value => the value kept in the table that is equal
+		to the value (the value itself if it is the first), for text and
+		floats. Other values are returned as they are, so that 1 and 1.0
+		(or True) are not mixed up, nor 0.0 and -0.0.
+	"""
+	if isinstance(value, str) or (isinstance(value, float) and value != 0):
+		return values.setdefault(value, value)
+
+	return value
+
+
+
+def compactLines(lines):
+	"""
+	[iterable] lines => [generator] SparseLines, sharing one value table.
+	"""
+	values = {}
+	for line in lines:
+		yield SparseLine(line, values)
@@ -0,0 +1,257 @@
+# coding=utf-8
+#
+# A binary snapshot of holding records.
+#
+# Records from trustee.fileToRecords() or report.consolidateRecords() are
+# saved column by column, so that they can be loaded again without parsing
+# text:
+#
+# 1. numeric columns as little endian float64,
+# 2. text columns as uint32 indexes into a string dictionary,
+# 3. the headers of each record, in their original order, as a uint16
+#	layout code per row.
+#
+# The file starts with a magic number, the length of the header and the
+# header itself (json), which describes the columns and where they are.
+# Each section after it starts at a multiple of 8 bytes.
+#
+# A snapshot is opened by memory mapping the file, the columns are views
+# into the mapped file, nothing is read until it is used. For example,
+#
+# writeSnapshot('htm 201804.snap', consolidateRecords(records))
+# with Snapshot('htm 201804.snap') as s:
+# 	total = sum(s.column('total amortized cost'))
+#
+
+from array import array
+from struct import Struct
+import json, mmap, sys
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+MAGIC = b'CLAMCSN1'
+VERSION = 1
+PREFIX = Struct('<8sI4x')	# magic, header length, padding
+NO_STRING = 0xFFFFFFFF		# string index of a missing value
+
+
+
+def writeSnapshot(fileName, records):
+	"""
+	[string] file name, [iterable] records => [int] number of records saved
+
+	A column must hold either numbers (int or float, saved as float) or
+	strings only, otherwise ValueError is raised.
+	"""
+	records = list(records)
+	layouts, layoutCodes = [], {}
+	headers = []
+	rowLayouts = array('H')
+	for record in records:
+		layout = tuple(record.keys())
+		if not layout in layoutCodes:
+			layoutCodes[layout] = len(layouts)
+			layouts.append(layout)
+			headers.extend(h for h in layout if not h in headers)
+		rowLayouts.append(layoutCodes[layout])
+
+	strings, stringCodes = [], {}
+	def stringIndex(value):
+		try:
+			return stringCodes[value]
+		except KeyError:
+			stringCodes[value] = len(strings)
+			strings.append(value)
+			return stringCodes[value]
+
+	sections = [rowLayouts.tobytes()]
+	columns = []
+	for header in headers:
+		values = [record.get(header) for record in records]
+		present = [v for v in values if v is not None]
+		if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+			columnType = 'float64'
+			data = array('d', (float('nan') if v is None else v for v in values))
+		elif all(isinstance(v, str) for v in present):
+			columnType = 'string'
+			data = array('I', (NO_STRING if v is None else stringIndex(v) for v in values))
+		else:
+			logger.error('writeSnapshot(): column \'{0}\' mixes types'.format(header))
+			raise ValueError
+
+		columns.append((header, columnType, len(sections)))
+		sections.append(data.tobytes())
+
+	encoded = [s.encode('utf-8') for s in strings]
+	offsets = array('I', [0])
+	for s in encoded:
+		offsets.append(offsets[-1] + len(s))
+	sections.append(offsets.tobytes())
+	sections.append(b''.join(encoded))
+
+	position, sectionOffsets = 0, []
+	for section in sections:
+		sectionOffsets.append(position)
+		position = position + padded(len(section))
+
+	header = json.dumps({ 'version': VERSION
+						, 'byteorder': 'little'
+						, 'rows': len(records)
+						, 'layouts': [list(layout) for layout in layouts]
+						, 'layout': sectionOffsets[0]
+						, 'columns': [ {'name': h, 'type': t, 'offset': sectionOffsets[i]} \
+										for (h, t, i) in columns]
+						, 'strings': { 'count': len(strings)
+									 , 'offsets': sectionOffsets[-2]
+									 , 'data': sectionOffsets[-1]
+									 }
+						}).encode('utf-8')
+
+	with open(fileName, 'wb') as f:
+		f.write(PREFIX.pack(MAGIC, len(header)))
+		f.write(header + bytes(padded(len(header)) - len(header)))
+		for section in sections:
+			f.write(section + bytes(padded(len(section)) - len(section)))
+
+	return len(records)
+
+
+
+def padded(length):
+	return (length + 7) // 8 * 8
+
+
+
+class Snapshot():
+	"""
+	A snapshot file opened by memory mapping. Numeric columns are float64
+	views of the file, text columns are decoded on use, and each string is
+	decoded once.
+	"""
+	def __init__(self, fileName):
+		if sys.byteorder != 'little':
+			logger.error('Snapshot(): only little endian machines are supported')
+			raise ValueError
+
+		with open(fileName, 'rb') as f:
+			self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		self.buffer = memoryview(self.mm)
+		self.views = []
+		magic, headerLength = PREFIX.unpack_from(self.buffer)
+		if magic != MAGIC:
+			self.close()
+			logger.error('Snapshot(): {0} is not a snapshot file'.format(fileName))
+			raise ValueError
+
+		self.header = json.loads(bytes(self.buffer[PREFIX.size:PREFIX.size+headerLength]))
+		if self.header['version'] != VERSION:
+			self.close()
+			logger.error('Snapshot(): unknown version {0}'.format(self.header['version']))
+			raise ValueError
+
+		self.base = PREFIX.size + padded(headerLength)
+		self.length = self.header['rows']
+		self.columns = {c['name']: c for c in self.header['columns']}
+		self.headers = [c['name'] for c in self.header['columns']]
+		self.layouts = [tuple(layout) for layout in self.header['layouts']]
+		self.rowLayouts = self.view(self.header['layout'], 'H', self.length)
+		strings = self.header['strings']
+		self.stringOffsets = self.view(strings['offsets'], 'I', strings['count'] + 1)
+		self.stringData = self.base + strings['data']
+		self.strings = [None] * strings['count']
+
+
+	def view(self, offset, format, count):
+		"""
+		[int] offset from the first section, [string] format, [int] count
+			=> [memoryview] of count items of the format
+		"""
+		size = array(format).itemsize
+		start = self.base + offset
+		v = self.buffer[start:start+count*size].cast(format)
+		self.views.append(v)
+		return v
+
+
+	def __len__(self):
+		return self.length
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *args):
+		self.close()
+		return False
+
+
+	def close(self):
+		"""
+		Release the views and unmap the file. Views handed out by column()
+		or codes() must not be in use any more.
+		"""
+		for v in self.views:
+			v.release()
+		self.views = []
+		self.buffer.release()
+		self.mm.close()
+
+
+	def string(self, index):
+		"""
+		[int] index => [string] the string in the dictionary, None for
+			NO_STRING.
+		"""
+		if index == NO_STRING:
+			return None
+		s = self.strings[index]
+		if s is None:
+			start = self.stringData + self.stringOffsets[index]
+			end = self.stringData + self.stringOffsets[index+1]
+			s = self.strings[index] = str(self.buffer[start:end], 'utf-8')
+
+		return s
+
+
+	def columnType(self, header):
+		return self.columns[header]['type']
+
+
+	def codes(self, header):
+		"""
+		[string] header of a text column => [memoryview] uint32 string
+			indexes, see string().
+		"""
+		return self.view(self.columns[header]['offset'], 'I', self.length)
+
+
+	def column(self, header):
+		"""
+		[string] header => [memoryview] float64 values of a numeric column
+			(NaN where a record does not have the header), or [list] values
+			of a text column (None where a record does not have it).
+		"""
+		if self.columnType(header) == 'float64':
+			return self.view(self.columns[header]['offset'], 'd', self.length)
+
+		return list(map(self.string, self.codes(header)))
+
+
+	def layout(self, row):
+		"""
+		[int] row => [tuple] headers of the record in that row
+		"""
+		return self.layouts[self.rowLayouts[row]]
+
+
+	def records(self):
+		"""
+		=> [list] records (dictionaries), the same as the ones saved except
+			that numbers are all floats.
+		"""
+		columns = {h: self.column(h) for h in self.headers}
+		return [{h: columns[h][i] for h in self.layout(i)} for i in range(self.length)]
@@ -0,0 +1,110 @@
+# coding=utf-8
+#
+# Measure the cold start of each cli.py subcommand: the time a new Python
+# process takes to import cli.py, then what the subcommand needs (see
+# cli.load()), less the time to start Python itself. The job is not run.
+#
+# Each measurement is the fastest of a few runs, and is checked against a
+# budget in seconds, so that a module level import added to a module the
+# subcommands use does not go unnoticed. Run it like:
+#
+# python startup.py --repeat 5 --json startup.json
+#
+# It exits with status 1 if a subcommand is over its budget.
+#
+
+from clamc_trustee.cli import COMMANDS
+import subprocess, sys, time, json
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+subcommand => seconds allowed for its imports
+"""
+BUDGET = { 'dates': 0.1
+		 , 'htm': 0.1
+		 , 'tscf': 0.1
+		 , 'historical': 0.1
+		 }
+
+LOAD = 'import sys; from clamc_trustee.cli import load; load({0!r}); print(len(sys.modules))'
+
+
+
+def runPython(code):
+	"""
+	[string] code => [float] seconds, [string] output
+
+	Run the code in a new Python process, raise ValueError with the error
+	message if it fails.
+	"""
+	start = time.perf_counter()
+	p = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+						stderr=subprocess.PIPE, universal_newlines=True)
+	seconds = time.perf_counter() - start
+	if p.returncode != 0:
+		raise ValueError(p.stderr.strip().split('\n')[-1])
+
+	return seconds, p.stdout.strip()
+
+
+
+def measureStartup(commands=None, repeat=5):
+	"""
+	[list] subcommands (all if None), [int] runs per subcommand
+		=> [dictionary] subcommand => measurement
+
+	A measurement has the seconds, the number of modules loaded, the budget
+	and whether it is over budget, or an error if the subcommand cannot be
+	loaded (e.g., a package it needs is not installed).
+	"""
+	python = min(runPython('pass')[0] for i in range(repeat))
+	results = {}
+	for command in COMMANDS if commands is None else commands:
+		try:
+			runs = [runPython(LOAD.format(command)) for i in range(repeat)]
+		except ValueError as e:
+			logger.warning('measureStartup(): {0}: {1}'.format(command, e))
+			results[command] = {'error': str(e)}
+			continue
+
+		seconds = max(min(s for (s, output) in runs) - python, 0)
+		results[command] = { 'seconds': seconds
+						   , 'modules': int(runs[0][1])
+						   , 'budget': BUDGET.get(command)
+						   , 'over budget': command in BUDGET and seconds > BUDGET[command]
+						   }
+
+	return results
+
+
+
+def printResults(results):
+	print('{0:<12} {1:>10} {2:>10} {3:>8}'.format('command', 'seconds', 'budget', 'modules'))
+	for (command, r) in results.items():
+		if 'error' in r:
+			print('{0:<12} {1}'.format(command, r['error']))
+		else:
+			print('{0:<12} {1:>10.4f} {2:>10} {3:>8}{4}'.format(command, r['seconds'],
+					r['budget'], r['modules'], '  over budget' if r['over budget'] else ''))
+
+
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='Cold start time of cli.py subcommands')
+	parser.add_argument('commands', nargs='*', help='subcommands, all by default')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--json', help='write the results to this json file')
+	args = parser.parse_args()
+
+	results = measureStartup(args.commands or None, args.repeat)
+	printResults(results)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent=2)
+
+	sys.exit(1 if any(r.get('over budget') for r in results.values()) else 0)
@@ -0,0 +1,194 @@
+# coding=utf-8
+#
+# A SQLite database of holding records from trustee reports.
+#
+# Each record is stored as json (so that its headers keep their order),
+# together with the columns used to find it: portfolio, isin, valuation
+# date, type and accounting. Two indexes serve the usual questions:
+#
+# 1. (portfolio, isin, valuation date): a position over time, e.g., the
+#	amortized cost of an ISIN in 12229 across 2018,
+# 2. (valuation date, type, accounting): all holdings of a kind on a day.
+#
+# Loading a file replaces whatever was loaded from the same file (by name)
+# for the same valuation date, so a file can be loaded again safely. A file
+# whose content has not changed is not parsed again. For example,
+#
+# with HoldingsStore('holdings.db') as store:
+# 	store.loadFolder(join(get_current_path(), 'trustee_reports'))
+# 	records = store.query(portfolio='12229', isin='HK0000171949',
+# 							start='2018-01-01', end='2018-12-31')
+# 	writeCsv('12229 HK0000171949.csv', recordsToRows(records))
+#
+
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.report import getExcelFiles
+from clamc_trustee.cache import fileHash
+from itertools import islice
+from functools import partial
+from os.path import basename
+import sqlite3, json
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+	source TEXT NOT NULL,
+	valuation_date TEXT NOT NULL,
+	hash TEXT NOT NULL,
+	records INTEGER NOT NULL,
+	PRIMARY KEY (source, valuation_date)
+);
+CREATE TABLE IF NOT EXISTS holdings (
+	id INTEGER PRIMARY KEY,
+	source TEXT NOT NULL,
+	valuation_date TEXT NOT NULL,
+	portfolio TEXT,
+	isin TEXT,
+	type TEXT,
+	accounting TEXT,
+	record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS holdings_position
+	ON holdings (portfolio, isin, valuation_date);
+CREATE INDEX IF NOT EXISTS holdings_date
+	ON holdings (valuation_date, type, accounting);
+CREATE INDEX IF NOT EXISTS holdings_source
+	ON holdings (source, valuation_date);
+"""
+
+
+
+class HoldingsStore():
+	"""
+	Holding records in a SQLite database, ':memory:' for one that is not
+	saved. Records are inserted batchSize at a time.
+	"""
+	def __init__(self, fileName=':memory:', batchSize=1000):
+		self.connection = sqlite3.connect(fileName)
+		self.batchSize = batchSize
+		self.connection.executescript(SCHEMA)
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *args):
+		self.close()
+		return False
+
+
+	def close(self):
+		self.connection.close()
+
+
+	def loadFolder(self, folder, reader=fileToRecords):
+		"""
+		[string] folder, [function] reader => [int] number of records loaded
+
+		Load all the files in the folder (see report.getExcelFiles()), files
+		that did not change since they were loaded are skipped.
+		"""
+		return sum(self.loadFile(file, reader) for file in getExcelFiles(folder))
+
+
+	def loadFile(self, fileName, reader=fileToRecords):
+		"""
+		[string] file, [function] reader => [int] number of records loaded,
+			0 if the file was loaded before with the same content.
+
+		reader: a function that turns a file into records, like
+			trustee.fileToRecords() or cache.RecordCache().fileToRecords.
+		"""
+		source = basename(fileName)
+		h = fileHash(fileName)
+		if self.connection.execute('SELECT 1 FROM sources WHERE source=? AND hash=?'
+									, (source, h)).fetchone() is not None:
+			logger.debug('loadFile(): {0} is loaded already'.format(fileName))
+			return 0
+
+		return self.loadRecords(source, reader(fileName), h)
+
+
+	def loadRecords(self, source, records, h=''):
+		"""
+		[string] source, [iterable] records, [string] hash of the source
+			=> [int] number of records loaded
+
+		The records of each valuation date replace those loaded before from
+		the same source for that date. Everything is loaded in one
+		transaction, so a failure leaves the store as it was.
+		"""
+		counts = {}		# valuation date => number of records
+		rows = map(partial(toRow, source), records)
+		with self.connection:
+			for batch in iter(lambda: list(islice(rows, self.batchSize)), []):
+				for valuationDate in set(row[1] for row in batch) - set(counts):
+					self.connection.execute('DELETE FROM holdings WHERE source=? '
+											'AND valuation_date=?', (source, valuationDate))
+					counts[valuationDate] = 0
+
+				for row in batch:
+					counts[row[1]] = counts[row[1]] + 1
+
+				self.connection.executemany('INSERT INTO holdings (source, '
+					'valuation_date, portfolio, isin, type, accounting, record) '
+					'VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+
+			self.connection.executemany('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)'
+				, [(source, date, h, count) for (date, count) in counts.items()])
+
+		total = sum(counts.values())
+		logger.info('loadRecords(): {0} records from {1}'.format(total, source))
+		return total
+
+
+	def query(self, portfolio=None, isin=None, valuationDate=None, start=None,
+				end=None, type=None, accounting=None):
+		"""
+		=> [list] records (dictionaries) matching all the conditions given,
+			by valuation date, then in the order they were loaded.
+
+		start, end: the first and last valuation date ('yyyy-mm-dd') of a
+			period, either can be left out.
+
+		The records have the same headers, in the same order, as the ones
+		loaded, so records of one kind can go to trustee.recordsToRows().
+		"""
+		conditions = [ ('portfolio = ?', portfolio)
+					 , ('isin = ?', isin)
+					 , ('valuation_date = ?', valuationDate)
+					 , ('valuation_date >= ?', start)
+					 , ('valuation_date <= ?', end)
+					 , ('type = ?', type)
+					 , ('accounting = ?', accounting)
+					 ]
+		conditions = [(c, v) for (c, v) in conditions if v is not None]
+		sql = 'SELECT record FROM holdings' + \
+				('' if conditions == [] else ' WHERE ' + ' AND '.join(c for (c, v) in conditions)) + \
+				' ORDER BY valuation_date, id'
+		return [json.loads(row[0]) for row in \
+				self.connection.execute(sql, [v for (c, v) in conditions])]
+
+
+	def valuationDates(self):
+		"""
+		=> [list] valuation dates in the store, earliest first.
+		"""
+		return [row[0] for row in self.connection.execute(
+					'SELECT DISTINCT valuation_date FROM sources ORDER BY valuation_date')]
+
+
+
+def toRow(source, record):
+	"""
+	[string] source, [dictionary] record => [tuple] values of a row in the
+		holdings table.
+	"""
+	return ( source, record['valuation date'], record.get('portfolio')
+		   , record.get('isin'), record.get('type'), record.get('accounting')
+		   , json.dumps(dict(record))
+		   )
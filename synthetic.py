@@ -0,0 +1,298 @@
+# coding=utf-8
+#
+# Generate synthetic trustee reports for testing and benchmarking.
+#
+# The reports have the same layout as the real ones (see samples/), i.e., a
+# file header with fund name and valuation period, then sections of cash,
+# HTM bonds, AFS bonds and equities, each with a three-line bilingual header,
+# the positions and a total line, and an accruals section at the end. HTM
+# bonds can have multiple lots, where only the first lot has description
+# and currency filled.
+#
+# Writing .xls files needs the xlwt package. For example,
+#
+# writeFolder('synthetic', files=100, bonds=500, seed=1)
+#
+
+from clamc_trustee.trustee import idMap
+from os.path import join
+import random
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+Column layouts of the sections, each column being (column index, the 4
+lines of the header, field). The first header line is the section title
+line, the field tells generateRow() what value to put in the column.
+"""
+HKD_EQUIV = '港元                等值'
+
+CASH_COLUMNS = [
+	(0, '', '', '項目 & 戶口號碼', 'Description & Account No.', 'description'),
+	(2, '', '', '幣值', 'CCY', 'currency'),
+	(13, '平均匯率', 'Avg', 'FX', 'Rate', 'fx rate'),
+	(15, '投資組合', '貨幣匯率', 'Ex', 'Rate', 'fx rate'),
+	(18, '', '', '成本', 'Cost', 'cost'),
+	(20, '', '應收利息', 'Accr.', 'Int.', 'zero'),
+	(22, '總市值', 'Total', 'Mkt', 'Value', 'cost'),
+	(26, HKD_EQUIV, '成本', 'Cost', 'HKD', 'cost HKD'),
+	(28, HKD_EQUIV, '應收利息', 'Acc. Int.', 'HKD', 'zero'),
+	(30, HKD_EQUIV, '總市值', 'Total Mkt Value', 'HKD', 'cost HKD'),
+	(34, HKD_EQUIV, '盈/虧-匯率', 'P/L FX', 'HKD Equiv.', 'zero'),
+	(36, '基金', '百分比', '% of', 'Fund', 'percentage')
+]
+
+BOND_COLUMNS = [
+	(0, '', '', '項目', 'Description', 'description'),
+	(2, '', '', '幣值', 'CCY', 'currency'),
+	(4, '', '票面值', 'Par', 'Amt', 'quantity'),
+	(6, '', '利率', 'Interest', 'Rate%', 'coupon'),
+	(8, '利息起計日', 'Interest', 'Start', 'Day', 'start day'),
+	(10, '', '', '到期日', 'Maturity', 'maturity'),
+	(13, '', '平均成本', 'Avg', 'Cost ', 'average cost'),
+	(18, '', '', '成本', 'Cost', 'cost'),
+	(20, '', '應收利息', 'Accr.', 'Int.', 'accrued'),
+	(26, HKD_EQUIV, '成本', 'Cost', 'HKD', 'cost HKD'),
+	(28, HKD_EQUIV, '應收利息', 'Acc. Int.', 'HKD', 'accrued HKD'),
+	(34, HKD_EQUIV, '盈/虧-匯率', 'P/L FX', 'HKD', 'zero'),
+	(36, '基金', '百份比', '% of', 'Fund', 'percentage')
+]
+
+HTM_BOND_COLUMNS = BOND_COLUMNS + [
+	(15, '攤銷後', '修正價', 'Amortized', 'Price', 'price'),
+	(22, '總攤銷值', 'Total', 'Amortized', 'Value', 'value'),
+	(24, '盈/虧-攤銷值', 'P/L', 'A.', 'Value', 'gain loss'),
+	(30, HKD_EQUIV, '總攤銷值', 'Total A. Value', 'HKD', 'value HKD'),
+	(32, HKD_EQUIV, '盈/虧-攤銷值', 'P/L A. Value', 'HKD', 'gain loss HKD')
+]
+
+AFS_BOND_COLUMNS = BOND_COLUMNS + [
+	(15, '', '市場現價', 'Market', 'Price', 'price'),
+	(22, '總市值', 'Total', 'Mkt', 'Value', 'value'),
+	(24, '盈/虧-市值', 'P/L', 'M.', 'Value', 'gain loss'),
+	(30, HKD_EQUIV, '總市值', 'Total Mkt Value', 'HKD', 'value HKD'),
+	(32, HKD_EQUIV, '盈/虧-市值', 'P/L M. Value', 'HKD', 'gain loss HKD')
+]
+
+EQUITY_COLUMNS = [
+	(0, '', '', '項目', 'Description', 'description'),
+	(2, '', '', '幣值', 'CCY', 'currency'),
+	(4, '', '', '股數', 'Share', 'quantity'),
+	(8, '', '最近交易日', 'Latest', 'T. D.', 'start day'),
+	(13, '', '平均成本', 'Avg', 'Cost', 'average cost'),
+	(15, '', '市場現價', 'Market', 'Price', 'price'),
+	(18, '', '', '成本價', 'Cost', 'cost'),
+	(20, '', '應收紅利', 'Acc.', 'Dividend', 'accrued'),
+	(22, '總市值', 'Total', 'M.', 'Value', 'value'),
+	(24, '盈/虧-市值', 'P/L', 'M.', 'Value', 'gain loss'),
+	(26, HKD_EQUIV, '成本', 'Cost', 'HKD', 'cost HKD'),
+	(28, HKD_EQUIV, '應收紅利', 'Acc. Dividend', 'HKD', 'accrued HKD'),
+	(30, HKD_EQUIV, '總市值', 'Total Mkt Value', 'HKD', 'value HKD'),
+	(32, HKD_EQUIV, '盈/虧-市值', 'P/L M. Value', 'HKD', 'gain loss HKD'),
+	(34, HKD_EQUIV, '盈/虧-匯率', 'P/L FX', 'HKD', 'zero'),
+	(36, '基金', '百份比', '% of', 'Fund', 'percentage')
+]
+
+ACCRUAL_COLUMNS = [
+	(0, '', '', '項目', 'Description', 'description'),
+	(1, '', '', '幣值', 'CCY', 'currency'),
+	(21, '總市值', 'Total', 'Mkt', 'Value', 'zero'),
+	(29, HKD_EQUIV, '總市值', 'Total Mkt Value', 'HKD', 'zero'),
+	(35, '基金', '百份比', '% of', 'Fund', 'zero')
+]
+
+FX_RATE = {'HKD': 1.0, 'USD': 7.8485, 'CNY': 1.2396}
+
+CURRENCY_NAME = {'HKD': '港元', 'USD': '美元', 'CNY': '人民幣'}
+
+ROMAN = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X', 'XI',
+		 'XII', 'XIII', 'XIV', 'XV', 'XVI', 'XVII', 'XVIII', 'XIX', 'XX']
+
+
+
+def generateRow(columns, currency, rng, first=True):
+	"""
+	[list] columns, [string] currency, [Random] rng, [Bool] first
+		=> [dictionary] column index => value
+
+	first: False for the second and later lots of a multi-lot HTM bond,
+		whose description and currency are empty.
+	"""
+	quantity = float(rng.randrange(1, 2000)*10000)
+	price = round(rng.uniform(90, 110), 7)
+	cost = round(quantity*rng.uniform(95, 105)/100, 2)
+	accrued = round(quantity*rng.uniform(0, 3)/100, 2)
+	value = round(quantity*price/100 + accrued, 2)
+	fx = FX_RATE[currency]
+	values = {
+		'description': 'XS{0:010d} SYNTHETIC {1}'.format(
+							rng.randrange(10**10), rng.choice(['BOND', 'CORP', 'HLDG'])),
+		'currency': currency,
+		'quantity': quantity,
+		'coupon': rng.choice([3.5, 4.25, 5.0, 5.875, 6.15, 7.625]),
+		'start day': float(rng.randrange(43000, 43220)),
+		'maturity': float(rng.randrange(43600, 54800)),
+		'average cost': round(cost/quantity*100, 7),
+		'price': price,
+		'cost': cost,
+		'accrued': accrued,
+		'value': value,
+		'gain loss': round(value - cost - accrued, 2),
+		'cost HKD': round(cost*fx, 2),
+		'accrued HKD': round(accrued*fx, 2),
+		'value HKD': round(value*fx, 2),
+		'gain loss HKD': round((value - cost - accrued)*fx, 2),
+		'fx rate': fx,
+		'percentage': round(rng.uniform(0, 0.02), 4),
+		'zero': 0.0
+	}
+	if not first:
+		values['description'] = ''
+		values['currency'] = ''
+
+	return {column: values[field] for (column, _, _, _, _, field) in columns}
+
+
+
+def sectionRows(title, columns, positions):
+	"""
+	[string] title, [list] columns, [list] positions => [list] rows
+
+	positions: rows of the positions, each row being a dictionary mapping
+		column index to value.
+
+	The rows of a section, i.e., the title line, the header lines, the
+	positions and a total line, followed by blank lines.
+	"""
+	header = [{column: lines[k] for (column, *lines, _) in columns} for k in range(4)]
+	header[0][0] = title
+	totalColumns = [column for (column, *_) in columns if column >= 18]
+	total = {column: sum(p.get(column, 0) for p in positions) for column in totalColumns}
+	return header + [{}] + positions + [{}, total, {}, {}, {}]
+
+
+
+def reportRows(portfolioName, valuationDate, sections):
+	"""
+	[string] portfolio name, [string] valuation date (yyyy-mm-dd),
+	[list] sections => [list] rows of a trustee report
+
+	sections: a list of (title, columns, positions)
+	"""
+	yyyy, mm, dd = valuationDate.split('-')
+	rows = [
+		{1: '中國人壽信托有限公司', 11: 'Report Ref: 05'},
+		{1: 'CHINA LIFE TRUSTEES LIMITED', 11: 'Sheet Ref: Portfolio Val.'},
+		{1: 'PORTFOLIO VALUATION REPORT', 11: 'Date: {0}/{1}/{2}'.format(dd, mm, yyyy)},
+		{1: '基金投資組合報表', 11: '(07:43:05) Time: 07:35:11'},
+		{11: 'By: CLIO-HIPORT\\DSTOpt'},
+		{0: '基金名稱: 中國人壽保險(海外)股份有限公司信託基金'},
+		{0: 'Fund Name: {0}   '.format(portfolioName)},
+		{0: '估值期: 由                          至'},
+		{0: 'Valuation Period: From 01/{0}/{1} to {2}/{0}/{1}'.format(mm, yyyy, dd)},
+		{}
+	]
+	for (i, (title, columns, positions)) in enumerate(sections):
+		rows.extend(sectionRows('{0}. {1}'.format(ROMAN[i], title), columns, positions))
+
+	rows.extend(sectionRows('{0}. Accruals & Outstanding Settlement (應付/應收款項)' \
+					.format(ROMAN[len(sections)]), ACCRUAL_COLUMNS, [{29: 0.0, 35: 0.0}]))
+	rows.append({0: 'Total (總額)', 29: 0.0, 35: 1.0})
+	return rows
+
+
+
+def generateSections(rng, bonds=50, lots=3, equities=10, afsBonds=5,
+						currencies=('HKD', 'USD')):
+	"""
+	[Random] rng, [int] number of HTM bonds, [int] max. number of lots
+	per HTM bond, [int] number of equities, [int] number of AFS bonds,
+	[tuple] currencies => [list] sections, see reportRows().
+
+	Positions are spread evenly over the currencies.
+	"""
+	def spread(n):
+		return [n//len(currencies) + (1 if i < n%len(currencies) else 0) \
+				for i in range(len(currencies))]
+
+	def htmPositions(n, currency):
+		positions = []
+		for _ in range(n):
+			positions.append(generateRow(HTM_BOND_COLUMNS, currency, rng))
+			for _ in range(rng.randrange(lots) if lots > 1 else 0):
+				positions.append(generateRow(HTM_BOND_COLUMNS, currency, rng, False))
+		return positions
+
+	sections = []
+	for currency in currencies:
+		sections.append(('Cash - {0} (現金 - {1})'.format(currency, CURRENCY_NAME[currency]),
+						CASH_COLUMNS, [generateRow(CASH_COLUMNS, currency, rng)]))
+	for (n, currency) in zip(spread(bonds), currencies):
+		if n > 0:
+			sections.append(('Debt Securities - {0} Held for Maturity (持有到期債務票據 - {1})' \
+							.format(currency, CURRENCY_NAME[currency]),
+							HTM_BOND_COLUMNS, htmPositions(n, currency)))
+	for (n, currency) in zip(spread(afsBonds), currencies):
+		if n > 0:
+			sections.append(('Debt Securities - {0} Available for Sales (可供出售債務票據 - {1})' \
+							.format(currency, CURRENCY_NAME[currency]), AFS_BOND_COLUMNS,
+							[generateRow(AFS_BOND_COLUMNS, currency, rng) for _ in range(n)]))
+	for (n, currency) in zip(spread(equities), currencies):
+		if n > 0:
+			sections.append(('Equities - {0} Available for Sales (可供出售股票 - {1})' \
+							.format(currency, CURRENCY_NAME[currency]), EQUITY_COLUMNS,
+							[generateRow(EQUITY_COLUMNS, currency, rng) for _ in range(n)]))
+
+	return sections
+
+
+
+def writeRows(fileName, rows):
+	"""
+	[string] file name, [list] rows => write the rows to the first sheet
+		of an .xls file.
+	"""
+	import xlwt
+	wb = xlwt.Workbook(encoding='utf-8')
+	ws = wb.add_sheet('Portfolio Val.')
+	for (i, row) in enumerate(rows):
+		for (column, value) in row.items():
+			ws.write(i, column, value)
+
+	wb.save(fileName)
+
+
+
+def writeReport(fileName, portfolioName=None, valuationDate='2018-04-30',
+				seed=None, **kwargs):
+	"""
+	[string] file name, [string] portfolio name (one of trustee.idMap),
+	[string] valuation date, [int] seed => [string] file name
+
+	Write a synthetic trustee report, kwargs are passed on to
+	generateSections() to control its size.
+	"""
+	rng = random.Random(seed)
+	if portfolioName is None:
+		portfolioName = rng.choice(sorted(idMap))
+
+	writeRows(fileName, reportRows(portfolioName, valuationDate,
+									generateSections(rng, **kwargs)))
+	return fileName
+
+
+
+def writeFolder(folder, files=10, valuationDate='2018-04-30', seed=None,
+				**kwargs):
+	"""
+	[string] folder, [int] number of files, [string] valuation date,
+	[int] seed => [list] files written
+
+	Write synthetic trustee reports into the folder, see writeReport().
+	"""
+	rng = random.Random(seed)
+	return [writeReport(join(folder, 'synthetic_{0:04d}.xls'.format(i)),
+						valuationDate=valuationDate, seed=rng.random(),
+						**kwargs) for i in range(files)]
@@ -0,0 +1,76 @@
+# coding=utf-8
+#
+
+import unittest2
+from clamc_trustee.aggregate import aggregate, groupIds, sortByGroup, \
+                                    aggregateGroups, FIRST, SUM, weighted
+from clamc_trustee.trustee import patchHtmBondRecords
+
+
+
+class TestAggregate(unittest2.TestCase):
+    """
+    Group records and combine them by rules.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestAggregate, self).__init__(*args, **kwargs)
+
+
+    def getRecords(self):
+        return [ {'isin': 'A', 'currency': 'HKD', 'quantity': 100.0, 'amortized cost': 99.0, 'total cost': 1.0}
+               , {'isin': 'B', 'currency': 'USD', 'quantity': 50.0, 'amortized cost': 101.0, 'total cost': 2.0}
+               , {'isin': 'A', 'currency': 'HKD', 'quantity': 300.0, 'amortized cost': 103.0, 'total cost': 3.0}
+               , {'isin': 'C', 'currency': 'HKD', 'quantity': 10.0, 'amortized cost': 98.0, 'total cost': 4.0}
+               ]
+
+
+    def testGroupIds(self):
+        ids, count = groupIds(self.getRecords(), ['isin'])
+        self.assertEqual((ids, count), ([0, 1, 0, 2], 3))
+        self.assertEqual(sortByGroup(ids, count), ([0, 2, 1, 3], [0, 2, 3, 4]))
+
+
+    def testHoldingRules(self):
+        records = self.getRecords()
+        result = aggregate(records, lambda r: r['isin'])
+        self.assertEqual([r['isin'] for r in result], ['A', 'B', 'C'])
+        self.assertEqual(result[0], {'isin': 'A', 'currency': 'HKD', 'quantity': 400.0,
+                                     'amortized cost': 102.0, 'total cost': 4.0})
+        self.assertTrue(result[1] is records[1])    # a group of one
+
+
+    def testRollup(self):
+        rules = {'currency': FIRST, 'isin': FIRST, 'amortized cost': weighted('quantity')}
+        result = aggregate(self.getRecords(), ['currency'], rules, default=SUM)
+        self.assertEqual([r['currency'] for r in result], ['HKD', 'USD'])
+        self.assertEqual(result[0]['quantity'], 410.0)
+        self.assertAlmostEqual(result[0]['amortized cost'], (9900+30900+980)/410)
+        self.assertEqual(result[0]['isin'], 'A')
+        self.assertEqual(aggregate([], ['currency'], rules), [])
+
+
+    def testCompensatedSum(self):
+        records = [{'k': 1, 'v': v} for v in [1e16, 1.0, -1e16] * 3]
+        self.assertEqual(aggregate(records, ['k'], {'k': FIRST})[0]['v'], 3.0)
+
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            aggregate(self.getRecords(), ['isin'], {'total cost': 'max'})
+        with self.assertRaises(ValueError):
+            aggregate([{'k': 1, 'q': 0.0, 'c': 1.0}] * 2, ['k'], 
+                      {'k': FIRST, 'c': weighted('q')})
+
+
+    def testPatchHtmBondRecords(self):
+        records = [ {'description': 'X1 bond', 'currency': 'HKD', 'quantity': 100.0, 'amortized cost': 99.0}
+                  , {'description': '', 'currency': '', 'quantity': 300.0, 'amortized cost': 103.0}
+                  , {'description': 'X2 bond', 'currency': 'USD', 'quantity': 50.0, 'amortized cost': 101.0}
+                  ]
+        result = patchHtmBondRecords(records)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0], {'description': 'X1 bond', 'currency': 'HKD',
+                                     'quantity': 400.0, 'amortized cost': 102.0})
+        self.assertTrue(result[1] is records[2])
+        self.assertEqual(patchHtmBondRecords([]), [])
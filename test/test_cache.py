@@ -0,0 +1,62 @@
+# coding=utf-8
+# 
+
+import unittest2, os, shutil, tempfile
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee import trustee
+from clamc_trustee.cache import RecordCache
+
+
+
+class TestCache(unittest2.TestCase):
+    """
+    Cache records of trustee files.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestCache, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file = os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_CGFB 1804.xls')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+
+    def testHit(self):
+        cache = RecordCache(self.directory)
+        records = cache.fileToRecords(self.file)
+        self.assertEqual(records, fileToRecords(self.file))
+        self.assertEqual(len(cache.entries()), 1)
+
+        # a second read comes from the cache
+        self.assertEqual(cache.fileToRecords(self.file), records)
+        self.assertEqual(len(cache.entries()), 1)
+
+
+
+    def testInvalidate(self):
+        cache = RecordCache(self.directory)
+        cache.fileToRecords(self.file)
+        trustee.bondIsinMap['TEST'] = 'XS0000000000'
+        try:
+            cache.fileToRecords(self.file)
+        finally:
+            del trustee.bondIsinMap['TEST']
+
+        self.assertEqual(len(cache.entries()), 2)
+        cache.clear()
+        self.assertEqual(cache.entries(), [])
+
+
+
+    def testEvict(self):
+        cache = RecordCache(self.directory, 1)
+        cache.fileToRecords(self.file)
+        self.assertEqual(cache.entries(), [])
@@ -0,0 +1,89 @@
+# coding=utf-8
+#
+
+import unittest2
+from os.path import join, basename
+from contextlib import redirect_stdout
+from io import StringIO
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.cli import main
+from clamc_trustee.startup import runPython, measureStartup
+from clamc_trustee.tscf import readUpload
+import shutil, tempfile
+
+
+
+class TestCli(unittest2.TestCase):
+    """
+    Run the subcommands on a copy of the test folder.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestCli, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for f in ('AFBH1', 'AFBH5'):
+            shutil.copy(join(get_current_path(), 'samples', 'testfolder',
+                            '00._Portfolio_Consolidation_Report_{0} 1804.xls'.format(f))
+                        , self.folder)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+
+    def runMain(self, argv):
+        output = StringIO()
+        with redirect_stdout(output):
+            status = main(argv)
+        return status, output.getvalue()
+
+
+    def testDates(self):
+        status, output = self.runMain(['dates', self.folder])
+        self.assertEqual(status, 0)
+        self.assertEqual(output.split('\n'),
+            [ '12734\t2018-04-30\t00._Portfolio_Consolidation_Report_AFBH1 1804.xls'
+            , '12229\t2018-04-30\t00._Portfolio_Consolidation_Report_AFBH5 1804.xls'
+            , ''])
+
+
+    def testTSCF(self):
+        status, output = self.runMain(['tscf', self.folder])
+        self.assertEqual(status, 0)
+        self.assertEqual(basename(output.strip()), 'f3321tscf.htm.2018-04-30.inc')
+        self.assertEqual(len(readUpload(output.strip())), 157)
+
+
+    def testHtm(self):
+        status, output = self.runMain(['htm', self.folder])
+        self.assertEqual(status, 0)
+        self.assertEqual(output.strip(), join(self.folder, 'htm bond consolidated.csv'))
+
+
+    def testFailure(self):
+        status, output = self.runMain(['dates', join(self.folder, 'no such folder')])
+        self.assertEqual(status, 1)
+        self.assertEqual(output, '')
+
+
+    def testLazyImport(self):
+        """
+        Importing cli.py loads nothing heavy, the 'dates' subcommand does
+        not load the logging configuration parser.
+        """
+        code = 'import sys; from clamc_trustee.cli import load; {0}; ' \
+                'print(sorted(m for m in sys.modules if m in ({1})))'
+        modules = "'xlrd', 'clamc_trustee.trustee', 'logging.config'"
+        self.assertEqual(runPython(code.format('pass', modules))[1], '[]')
+        self.assertEqual(runPython(code.format("load('dates')", modules))[1]
+                        , "['clamc_trustee.trustee']")
+
+
+    def testStartup(self):
+        results = measureStartup(['dates'], 1)
+        self.assertEqual(list(results), ['dates'])
+        self.assertTrue(results['dates']['modules'] > 0)
+        self.assertEqual(results['dates']['budget'], 0.1)
@@ -1,11 +1,11 @@
 # coding=utf-8
 # 
 
-import unittest2
+import unittest2, os, shutil, tempfile
 from os.path import join
 from clamc_trustee.utility import get_current_path
 from clamc_trustee.hcost import fileToTSCF, toDictionary, getRawPositions, \
-                                fileToLines, folderToTSCF
+                                fileToLines, folderToTSCF, historicalData
 from utils.iter import firstOf
 
 
@@ -65,4 +65,59 @@ class TestHCost(unittest2.TestCase):
 
         item = firstOf(bond2_yield, rows)
         self.assertTrue(item != None)
-        self.assertAlmostEqual(item[4], 5.9)
\ No newline at end of file
+        self.assertAlmostEqual(item[4], 5.9)
+
+
+
+    def testParallel(self):
+        """
+        Same rows in the same order with worker processes.
+        """
+        folder = join(get_current_path(), 'samples', 'test_historical')
+        rows = list(folderToTSCF(folder))
+        self.assertEqual(rows, list(folderToTSCF(folder, workers=2)))
+        self.assertEqual(rows, list(folderToTSCF(folder)))
+
+
+
+    def testHistoricalCache(self):
+        dataFile = join(get_current_path(), 'samples', 'test_historical'
+                       , 'CLO Holdings 2019.06.28.xlsx')
+        cacheDir = tempfile.mkdtemp()
+        try:
+            data = historicalData(dataFile, cacheDir)
+            self.assertEqual(1, len(os.listdir(cacheDir)))
+            self.assertEqual(data, historicalData(dataFile, cacheDir))
+            self.assertEqual(data, historicalData(dataFile))
+            self.assertAlmostEqual(data['HK0000226404'].purchase_cost, 99.027)
+        finally:
+            shutil.rmtree(cacheDir)
+
+
+
+
+    def testHistoricalCacheShared(self):
+        """
+        Data files sharing a cache folder keep their own entries, only an
+        older entry of the same data file is removed.
+        """
+        dataFile = join(get_current_path(), 'samples', 'test_historical'
+                       , 'CLO Holdings 2019.06.28.xlsx')
+        folder = tempfile.mkdtemp()
+        cacheDir = join(folder, 'cache')
+        try:
+            other = join(folder, 'CLO Holdings 2019.07.31.xlsx')
+            shutil.copy(dataFile, other)
+            os.makedirs(cacheDir)
+            stale = 'historical.CLO Holdings 2019.06.28.xlsx.0123abcd.pickle'
+            open(join(cacheDir, stale), 'wb').close()
+
+            data = historicalData(dataFile, cacheDir)
+            self.assertEqual(data, historicalData(other, cacheDir))
+            entries = os.listdir(cacheDir)
+            self.assertEqual(2, len(entries))
+            self.assertFalse(stale in entries)
+            self.assertEqual(sorted(e.split('.pickle')[0][:-41] for e in entries),
+                ['historical.CLO Holdings 2019.06.28.xlsx', 'historical.CLO Holdings 2019.07.31.xlsx'])
+        finally:
+            shutil.rmtree(folder)
@@ -0,0 +1,66 @@
+# coding=utf-8
+# 
+
+import unittest2, os, shutil, tempfile
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.report import readFiles
+from clamc_trustee.incremental import updateFolder, writeTSCFIncremental
+
+
+
+class TestIncremental(unittest2.TestCase):
+    """
+    Files arrive in a folder one by one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestIncremental, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.samples = join(get_current_path(), 'samples')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+
+    def addFile(self, name):
+        shutil.copy(join(self.samples, 
+            '00._Portfolio_Consolidation_Report_{0} 1804.xls'.format(name)), self.folder)
+
+
+
+    def testUpdate(self):
+        self.addFile('AFBH1')
+        records, changes = updateFolder(self.folder)
+        self.assertEqual(len(changes['parsed']), 1)
+        self.assertEqual(records, readFiles(self.folder))
+
+        self.addFile('CGFB')
+        records, changes = updateFolder(self.folder)
+        self.assertEqual(changes['parsed'], ['00._Portfolio_Consolidation_Report_CGFB 1804.xls'])
+        self.assertEqual(changes['unchanged'], ['00._Portfolio_Consolidation_Report_AFBH1 1804.xls'])
+        self.assertEqual(records, readFiles(self.folder))
+
+        # touch a file without changing its content
+        os.utime(join(self.folder, '00._Portfolio_Consolidation_Report_CGFB 1804.xls'), (0, 0))
+        records, changes = updateFolder(self.folder)
+        self.assertEqual(changes['parsed'], [])
+
+        os.remove(join(self.folder, '00._Portfolio_Consolidation_Report_AFBH1 1804.xls'))
+        records, changes = updateFolder(self.folder)
+        self.assertEqual(changes['removed'], ['00._Portfolio_Consolidation_Report_AFBH1 1804.xls'])
+        self.assertEqual(records, readFiles(self.folder))
+        self.assertEqual(set(r['portfolio'] for r in records), set(['12630']))
+
+
+
+    def testTSCF(self):
+        self.addFile('AFBH1')
+        file = writeTSCFIncremental(self.folder)
+        self.assertEqual(file, join(self.folder, 'f3321tscf.htm.2018-04-30.inc'))
+        with open(file) as f:
+            self.assertEqual(len(f.readlines()), 2 + 70)
@@ -0,0 +1,57 @@
+# coding=utf-8
+# 
+
+import unittest2, json, os, shutil, tempfile
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.report import readFiles, consolidateRecords, htmBond
+from clamc_trustee import instrument
+
+
+
+class TestInstrument(unittest2.TestCase):
+    """
+    Collect statistics of reading and consolidating two files.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestInstrument, self).__init__(*args, **kwargs)
+
+
+    def testCollect(self):
+        folder = join(get_current_path(), 'samples', 'testfolder')
+        with instrument.collect() as stats:
+            records = readFiles(folder)
+            consolidated = list(consolidateRecords(filter(htmBond, records)))
+
+        self.assertTrue(instrument.current is None)
+        stages = stats.stages
+        self.assertEqual(stages['readFiles']['records'], len(records))
+        self.assertEqual(stages['addFileInfo']['records'], len(records))
+        self.assertEqual(stages['addIdentifier']['records'], 
+                         len([r for r in records if r['type'] in ('bond', 'equity')]))
+        self.assertEqual(stages['openWorkbook']['calls'], 2)
+        self.assertEqual(stages['groupIds']['groups'], len(consolidated))
+        self.assertEqual(len(stats.files), 2)
+
+        file = join(folder, '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        fileStats = stats.files[file]
+        self.assertEqual(fileStats['parseSections']['sections'], 7)
+        self.assertEqual(fileStats['patchHtmBondRecords']['records'], 70)
+        self.assertEqual(fileStats['addFileInfo']['records'], 
+                         len([r for r in records if r['portfolio'] == '12734']))
+        self.assertTrue(fileStats['fileRows']['rows'] > 0)
+        self.assertTrue(fileStats['parseSections']['seconds'] > 0)
+
+        output = tempfile.mkdtemp()
+        try:
+            stats.writeJson(join(output, 'stats.json'))
+            with open(join(output, 'stats.json')) as f:
+                self.assertEqual(json.load(f), stats.toDict())
+        finally:
+            shutil.rmtree(output)
+
+
+
+    def testOff(self):
+        self.assertTrue(instrument.stage('any') is instrument.NULL_STAGE)
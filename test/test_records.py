@@ -0,0 +1,55 @@
+# coding=utf-8
+# 
+
+import unittest2, os, pickle
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.trustee import fileToRecords, recordsToRows
+from clamc_trustee.records import toCompactRecord, HtmBond, Equity, Cash
+
+
+
+class TestRecords(unittest2.TestCase):
+    """
+    Compact records behave the same as the dictionary records.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestRecords, self).__init__(*args, **kwargs)
+
+
+    def testFile(self):
+        file = os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_AFEH5 1804.xls')
+        records = fileToRecords(file)
+        compact = list(map(toCompactRecord, records))
+        self.assertEqual(set(type(r) for r in compact), set([Equity, Cash]))
+        self.assertEqual(compact, records)
+
+        equity = [r for r in compact if r['type'] == 'equity']
+        self.assertEqual(recordsToRows(equity), 
+                        recordsToRows([r for r in records if r['type'] == 'equity']))
+
+
+
+    def testRecord(self):
+        record = HtmBond({'description': 'XS01 Bond A', 'quantity': 100})
+        self.assertEqual(list(record.keys()), ['description', 'quantity'])
+        self.assertTrue('quantity' in record)
+        self.assertFalse('isin' in record)
+        self.assertRaises(KeyError, lambda: record['isin'])
+
+        record['isin'] = 'XS01'
+        self.assertEqual(record.get('isin'), 'XS01')
+        self.assertEqual(record.toDict(), 
+            {'description': 'XS01 Bond A', 'quantity': 100, 'isin': 'XS01'})
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+        def setInvalid():
+            record['ticker'] = 'XS01'
+        self.assertRaises(KeyError, setInvalid)
+
+
+
+    def testNoFit(self):
+        record = {'type': 'cash', 'description': 'Cash', 'unknown': 1}
+        self.assertTrue(toCompactRecord(record) is record)
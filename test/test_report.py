@@ -4,7 +4,12 @@
 import unittest2
 from os.path import join
 from clamc_trustee.utility import get_current_path
-from clamc_trustee.report import readFiles, consolidateRecords
+from clamc_trustee.report import readFiles, consolidateRecords, \
+                                readFilesParallel, securityKey, \
+                                writeTSCFFromRecords
+from clamc_trustee.tscf import readUpload, writeUpload
+from clamc_trustee.aggregate import groupIds
+import shutil, tempfile
 
 
 
@@ -36,6 +41,145 @@ class TestReport(unittest2.TestCase):
 
 
 
+    def testGroups(self):
+        """
+        Records are grouped by ISIN, or description if there is no ISIN,
+        and groups keep the order of their first record.
+        """
+        records = [ {'isin': 'XS01', 'description': 'XS01 Bond A'}
+                  , {'description': 'Cash HKD'}
+                  , {'isin': 'xs01 ', 'description': 'XS01 Bond A 6%'}
+                  , {'isin': '', 'description': 'cash  hkd'}
+                  ]
+        self.assertEqual(groupIds(records, securityKey), ([0, 1, 0, 1], 2))
+
+
+
+    def testParallel(self):
+        """
+        Parallel reading gives the same records as reading one by one.
+        """
+        folder = join(get_current_path(), 'samples', 'testfolder')
+        records, errors = readFilesParallel(folder, 2)
+        self.assertEqual(errors, [])
+        self.assertEqual(records, readFiles(folder))
+
+
+
+    def testParallelError(self):
+        """
+        A bad file is reported, the other files are still read.
+        """
+        folder = tempfile.mkdtemp()
+        try:
+            shutil.copy(join(get_current_path(), 'samples', 
+                '00._Portfolio_Consolidation_Report_CGFB 1804.xls'), folder)
+            with open(join(folder, 'bad.xls'), 'w') as f:
+                f.write('not an excel file')
+
+            records, errors = readFilesParallel(folder, 2)
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(errors[0][0], join(folder, 'bad.xls'))
+            self.assertTrue(len(records) > 0)
+            self.assertEqual(records[0]['portfolio'], '12630')
+        finally:
+            shutil.rmtree(folder)
+
+
+
+    def testDeltaTSCF(self):
+        """
+        Against the previous upload, only the changed and added rows are
+        sent.
+        """
+        records = readFiles(join(get_current_path(), 'samples', 'testfolder'))
+        folder = tempfile.mkdtemp()
+        try:
+            full = writeTSCFFromRecords(folder, records)
+            entries = readUpload(full)
+            previous = join(folder, 'previous.inc')
+            keys = sorted(entries)
+            changed, added = keys[0], keys[1]
+            writeUpload(previous, (k + (entries[k] + (0.5 if k == changed else 1e-9),) \
+                                    for k in keys if k != added))
+
+            upload = writeTSCFFromRecords(folder, records, previous, 1e-6)
+            self.assertEqual(upload, join(folder, 'f3321tscf.htm.2018-04-30.delta.inc'))
+            self.assertEqual(sorted(readUpload(upload)), sorted([changed, added]))
+            self.assertEqual(readUpload(join(folder, 'f3321tscf.htm.2018-04-30.full.inc'))
+                            , entries)
+            with open(join(folder, 'f3321tscf.htm.2018-04-30.summary.csv')) as f:
+                summary = f.read()
+            self.assertTrue('Unchanged,{0}'.format(len(keys)-2) in summary)
+        finally:
+            shutil.rmtree(folder)
+
+
+
+    def testDeltaChain(self):
+        """
+        Two months of deltas, each against the full file of the month
+        before: only the position that changed in a month is uploaded.
+        """
+        april = list(filter(htmBond, readFiles(join(get_current_path(), 'samples', 'testfolder'))))
+        def month(valuationDate, changed):
+            records = [dict(r, **{'valuation date': valuationDate}) for r in april]
+            records[changed]['amortized cost'] = records[changed]['amortized cost'] + 1
+            return records
+
+        folder = tempfile.mkdtemp()
+        try:
+            first = writeTSCFFromRecords(folder, april)
+            may = writeTSCFFromRecords(folder, month('2018-05-31', 0), first, 1e-6)
+            self.assertEqual(len(readUpload(may)), 1)
+            june = writeTSCFFromRecords(folder, month('2018-06-30', 1),
+                        join(folder, 'f3321tscf.htm.2018-05-31.full.inc'), 1e-6)
+            entries = readUpload(june)
+            self.assertEqual(len(entries), 2)   # back to April's value, and the change
+            self.assertEqual(sorted(k[1] for k in entries), 
+                             sorted([april[0]['isin'], april[1]['isin']]))
+            self.assertEqual(len(readUpload(join(folder, 'f3321tscf.htm.2018-06-30.full.inc'))),
+                             len(readUpload(first)))
+        finally:
+            shutil.rmtree(folder)
+
+
+
+    def testDeltaRerun(self):
+        """
+        A month run again against its own full file, after a correction:
+        the corrected position is uploaded, the full file is updated.
+        """
+        april = list(filter(htmBond, readFiles(join(get_current_path(), 'samples', 'testfolder'))))
+        folder = tempfile.mkdtemp()
+        try:
+            full = join(folder, 'f3321tscf.htm.2018-04-30.full.inc')
+            writeTSCFFromRecords(folder, april, writeTSCFFromRecords(folder, april), 1e-6)
+            self.assertEqual(len(readUpload(full)), 157)
+
+            corrected = [dict(r) for r in april]
+            corrected[0]['amortized cost'] = corrected[0]['amortized cost'] + 1
+            entries = readUpload(writeTSCFFromRecords(folder, corrected, full, 1e-6))
+            self.assertEqual([k[1] for k in entries], [april[0]['isin']])
+            self.assertEqual(readUpload(full), readUpload(
+                            writeTSCFFromRecords(folder, corrected)))
+        finally:
+            shutil.rmtree(folder)
+
+
+
+    def testTSCFNoRecords(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with self.assertRaises(ValueError):
+                writeTSCFFromRecords(folder, [])
+            with self.assertRaises(ValueError):
+                writeTSCFFromRecords(folder, iter([]), join(folder, 'previous.inc'))
+        finally:
+            shutil.rmtree(folder)
+
+
+
     def verifyBond1(self, records):
         """
         DBANFB12014 Dragon Days Ltd 6.0%, the bond exists in both 
@@ -0,0 +1,102 @@
+# coding=utf-8
+# 
+
+import unittest2, shutil, tempfile
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.report import readFiles, htmBond
+from clamc_trustee.series import SeriesIndex
+
+
+
+class TestSeries(unittest2.TestCase):
+    """
+    Amortized cost series from two months of HTM records.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestSeries, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.april = list(filter(htmBond, readFiles(join(get_current_path(), 
+                                                    'samples', 'testfolder'))))
+        # May: the same positions, the first one with a new amortized cost,
+        # the last one sold.
+        self.may = [dict(r, **{'valuation date': '2018-05-31'}) for r in self.april[:-1]]
+        self.may[0]['amortized cost'] = self.may[0]['amortized cost'] + 0.5
+        self.index = SeriesIndex()
+        self.index.addRecords(self.may)
+        self.index.addRecords(self.april)     # out of order on purpose
+
+
+    def testAsOf(self):
+        r = self.april[0]
+        p = self.index.asOf(r['portfolio'], r['isin'], '2018-05-15')
+        self.assertEqual(p.date, '2018-04-30')
+        self.assertEqual(p.amortized_cost, r['amortized cost'])
+        self.assertEqual(p.quantity, r['quantity'])
+        self.assertEqual(self.index.asOf(r['portfolio'], r['isin'], '2018-06-30').date, 
+                         '2018-05-31')
+        self.assertTrue(self.index.asOf(r['portfolio'], r['isin'], '2018-04-29') is None)
+        self.assertTrue(self.index.asOf('00000', r['isin'], '2018-04-30') is None)
+
+
+
+    def testRange(self):
+        r = self.april[0]
+        points = self.index.range(r['portfolio'], r['isin'])
+        self.assertEqual([p.date for p in points], ['2018-04-30', '2018-05-31'])
+        self.assertEqual(len(self.index.range(r['portfolio'], r['isin'], 
+                                              start='2018-05-01')), 1)
+        self.assertEqual(self.index.range(r['portfolio'], r['isin'], 
+                                          end='2018-03-31'), [])
+
+
+
+    def testChanges(self):
+        changes = self.index.changes('2018-04-30', '2018-05-31')
+        self.assertEqual(len(changes), 2)
+        keys = [(c.portfolio, c.isin) for c in changes]
+        self.assertTrue((self.april[0]['portfolio'], self.april[0]['isin']) in keys)
+        sold = [c for c in changes if c.isin == self.april[-1]['isin'] \
+                    and c.portfolio == self.april[-1]['portfolio']][0]
+        self.assertTrue(sold.after is None)
+
+
+
+    def testReplaceMonth(self):
+        """
+        Adding April again without its last position removes that position's
+        April point, and the position only in April is gone.
+        """
+        self.index.addRecords(self.april[:-1])
+        r = self.april[-1]
+        self.assertTrue(self.index.asOf(r['portfolio'], r['isin'], '2018-04-30') is None)
+        self.assertEqual(self.index.range(r['portfolio'], r['isin']), [])
+        self.assertFalse((r['portfolio'], r['isin']) in 
+                         [(c.portfolio, c.isin) for c in self.index.changes('2018-04-30', '2018-05-31')])
+        r = self.april[0]
+        self.assertEqual(self.index.asOf(r['portfolio'], r['isin'], '2018-04-30').amortized_cost,
+                         r['amortized cost'])
+
+
+
+    def testReplaceAndSave(self):
+        self.index.addRecords(self.may)
+        r = self.april[1]
+        self.assertEqual(len(self.index.range(r['portfolio'], r['isin'])), 2)
+        self.assertEqual(self.index.valuationDates(), ['2018-04-30', '2018-05-31'])
+
+        output = tempfile.mkdtemp()
+        try:
+            file = join(output, 'amortized cost.series')
+            self.index.save(file)
+            index = SeriesIndex.load(file)
+            self.assertEqual(len(index), len(self.index))
+            self.assertEqual(index.range(r['portfolio'], r['isin']), 
+                             self.index.range(r['portfolio'], r['isin']))
+            self.assertEqual(index.valuationDates(), self.index.valuationDates())
+            self.assertEqual(len(SeriesIndex.load(join(output, 'none'))), 0)
+        finally:
+            shutil.rmtree(output)
@@ -0,0 +1,76 @@
+# coding=utf-8
+# 
+
+import unittest2, shutil, tempfile, threading
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.report import readFiles, consolidateRecords, htmBond
+from clamc_trustee.service import makeServer, request
+
+
+
+class TestService(unittest2.TestCase):
+    """
+    Send requests to a service running in a thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestService, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.server = makeServer(0)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.folder = join(get_current_path(), 'samples', 'testfolder')
+
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+    def testParse(self):
+        file = join(self.folder, '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        reply = request('/parse', {'file': file}, self.port)
+        self.assertEqual(reply['records'], fileToRecords(file))
+        self.assertEqual(request('/status', port=self.port), {'files': 1, 'folders': 0})
+
+
+
+    def testConsolidate(self):
+        expected = list(consolidateRecords(filter(htmBond, readFiles(self.folder))))
+        with ThreadPoolExecutor(4) as executor:
+            replies = list(executor.map(lambda i: request('/consolidate', 
+                                {'folder': self.folder}, self.port), range(4)))
+
+        for reply in replies:
+            self.assertEqual(reply['records'], expected)
+        self.assertEqual(request('/status', port=self.port), {'files': 2, 'folders': 1})
+
+
+
+    def testTSCF(self):
+        folder = tempfile.mkdtemp()
+        try:
+            for name in ('00._Portfolio_Consolidation_Report_AFBH1 1804.xls',
+                         '00._Portfolio_Consolidation_Report_AFBH5 1804.xls'):
+                shutil.copy(join(self.folder, name), folder)
+            reply = request('/tscf', {'folder': folder}, self.port)
+            self.assertEqual(reply['file'], join(folder, 'f3321tscf.htm.2018-04-30.inc'))
+        finally:
+            shutil.rmtree(folder)
+
+
+
+    def testErrors(self):
+        with self.assertRaisesRegex(ValueError, 'missing parameter'):
+            request('/parse', {}, self.port)
+        with self.assertRaisesRegex(ValueError, 'FileNotFoundError'):
+            request('/parse', {'file': join(self.folder, 'none.xls')}, self.port)
+        with self.assertRaisesRegex(ValueError, 'unknown path'):
+            request('/none', {}, self.port)
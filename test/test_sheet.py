@@ -0,0 +1,128 @@
+# coding=utf-8
+# 
+
+import unittest2, os, gc, weakref
+from xlrd import open_workbook
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.sheet import sheetToLines, loadSheet, openWorkbook, \
+                                sheetRows, SparseLine, compactLines
+from clamc_trustee.trustee import fileToLines
+
+
+
+class TestSheet(unittest2.TestCase):
+    """
+    Read lines from the first sheet of a trustee file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestSheet, self).__init__(*args, **kwargs)
+
+
+    def getFile(self):
+        return os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+
+
+    def getSheet(self):
+        return open_workbook(filename=self.getFile()).sheet_by_index(0)
+
+
+
+    def testLines(self):
+        ws = self.getSheet()
+        lines = sheetToLines(ws)
+        self.assertEqual(len(lines), ws.nrows)
+        self.assertEqual(len(lines[0]), 37)
+        self.assertEqual('Fund Name: CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)'
+                        , lines[6][0].strip())
+        self.assertEqual(['', '', ''], lines[9][:3])
+
+
+
+    def testSkipBlank(self):
+        ws = self.getSheet()
+        lines = sheetToLines(ws, True)
+        self.assertEqual(len(lines), 122)
+        self.assertTrue(all(any(v != '' for v in line) for line in lines))
+        self.assertEqual('I. Cash - CNY (現金 - 人民幣)', lines[9][0])
+
+
+
+    def testLoadSheet(self):
+        ws = loadSheet(self.getFile())
+        self.assertEqual(sheetToLines(ws), sheetToLines(self.getSheet()))
+        self.assertEqual(loadSheet(self.getFile(), 'Sheet6').name, 'Sheet6')
+
+
+
+    def testOnDemand(self):
+        with openWorkbook(self.getFile()) as wb:
+            self.assertEqual(wb.nsheets, 8)
+            self.assertFalse(wb.sheet_loaded(0))
+            ws = wb.sheet_by_index(0)
+            self.assertTrue(wb.sheet_loaded(0))
+            self.assertFalse(wb.sheet_loaded(1))
+
+        self.assertEqual(len(sheetToLines(ws, True)), 122)
+
+
+
+    def testRelease(self):
+        """
+        Once released, the sheet and its workbook are freed as soon as the
+        sheet is, without the garbage collector.
+        """
+        gc.disable()
+        try:
+            ws = loadSheet(self.getFile())
+            sheet, book = weakref.ref(ws), weakref.ref(ws.book)
+            rows = sheetRows(ws, True, True)
+            self.assertEqual(len(list(rows)), 122)
+            self.assertEqual(ws.book, None)
+            del ws, rows
+            self.assertEqual((sheet(), book()), (None, None))
+
+            ws = loadSheet(self.getFile())
+            sheet = weakref.ref(ws)
+            rows = sheetRows(ws, True, True)
+            next(rows)
+            rows.close()
+            del ws, rows
+            self.assertEqual(sheet(), None)
+        finally:
+            gc.enable()
+
+
+
+    def testSparseLine(self):
+        line = ['', 'HKD', '', 1.5, '', '']
+        sparse = SparseLine(line)
+        self.assertEqual(len(sparse), 6)
+        self.assertEqual(sparse[1], 'HKD')
+        self.assertEqual(sparse[2], '')
+        self.assertEqual(sparse[-3], 1.5)
+        self.assertEqual(sparse[1:4], ['HKD', '', 1.5])
+        self.assertEqual(list(sparse), line)
+        self.assertEqual(sparse, line)
+        self.assertEqual(bytes(sparse.columns), bytes([1, 3]))
+        with self.assertRaises(IndexError):
+            sparse[6]
+
+        wide = SparseLine([''] * 300 + ['x'])
+        self.assertEqual(wide[300], 'x')
+        self.assertEqual(wide[299], '')
+
+
+
+    def testCompactLines(self):
+        lines = fileToLines(self.getFile(), True)
+        compact = fileToLines(self.getFile(), True, compact=True)
+        self.assertEqual(compact, lines)
+        self.assertTrue(all(isinstance(line, SparseLine) for line in compact))
+
+        a, b = list(compactLines([['x' + 'yz', 1.5, 0.0, 1], [''.join(['x', 'yz']), 1.5, -0.0, 1.0]]))
+        self.assertTrue(a[0] is b[0])
+        self.assertTrue(a[1] is b[1])
+        self.assertEqual(str(b[2]), '-0.0')
+        self.assertTrue(isinstance(a[3], int) and isinstance(b[3], float))
@@ -0,0 +1,81 @@
+# coding=utf-8
+# 
+
+import unittest2, shutil, tempfile
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.report import consolidateRecords, htmBond
+from clamc_trustee.snapshot import writeSnapshot, Snapshot
+
+
+
+class TestSnapshot(unittest2.TestCase):
+    """
+    Save records to a snapshot file and load them back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestSnapshot, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+
+    def getRecords(self):
+        return fileToRecords(join(get_current_path(), 'samples', 
+                                '00._Portfolio_Consolidation_Report_AFBH1 1804.xls'))
+
+
+    def testRecords(self):
+        records = self.getRecords()
+        file = join(self.output, 'afbh1.snap')
+        self.assertEqual(writeSnapshot(file, records), len(records))
+        with Snapshot(file) as s:
+            self.assertEqual(len(s), len(records))
+            self.assertEqual(s.records(), records)
+            self.assertEqual(s.columnType('isin'), 'string')
+            self.assertEqual(s.layout(0), tuple(records[0].keys()))
+
+
+
+    def testColumns(self):
+        records = list(consolidateRecords(filter(htmBond, self.getRecords())))
+        file = join(self.output, 'htm.snap')
+        writeSnapshot(file, records)
+        with Snapshot(file) as s:
+            cost = s.column('total amortized cost')
+            self.assertEqual(cost.format, 'd')
+            self.assertAlmostEqual(sum(cost), 
+                        sum(r['total amortized cost'] for r in records))
+            self.assertEqual(s.column('isin'), [r['isin'] for r in records])
+            del cost
+
+
+
+    def testMixedTypes(self):
+        file = join(self.output, 'bad.snap')
+        with self.assertRaises(ValueError):
+            writeSnapshot(file, [{'quantity': 1.0}, {'quantity': 'n.a.'}])
+
+
+
+    def testNotSnapshot(self):
+        file = join(self.output, 'bad.snap')
+        with open(file, 'wb') as f:
+            f.write(b'not a snapshot file')
+        with self.assertRaises(ValueError):
+            Snapshot(file)
+
+
+
+    def testEmpty(self):
+        file = join(self.output, 'empty.snap')
+        writeSnapshot(file, [])
+        with Snapshot(file) as s:
+            self.assertEqual(s.records(), [])
@@ -0,0 +1,63 @@
+# coding=utf-8
+# 
+
+import unittest2
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.trustee import fileToRecords, recordsToRows
+from clamc_trustee.report import readFiles
+from clamc_trustee.store import HoldingsStore
+
+
+
+class TestStore(unittest2.TestCase):
+    """
+    Load trustee files into a holdings store and query it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestStore, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.folder = join(get_current_path(), 'samples', 'testfolder')
+        self.store = HoldingsStore(batchSize=50)
+
+
+    def tearDown(self):
+        self.store.close()
+
+
+    def testLoad(self):
+        records = readFiles(self.folder)
+        self.assertEqual(self.store.loadFolder(self.folder), len(records))
+        self.assertEqual(self.store.query(), records)
+        self.assertEqual(self.store.valuationDates(), ['2018-04-30'])
+
+        # loading again changes nothing
+        self.assertEqual(self.store.loadFolder(self.folder), 0)
+        self.assertEqual(len(self.store.query()), len(records))
+
+
+
+    def testReplace(self):
+        file = join(self.folder, '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        records = fileToRecords(file)
+        self.store.loadRecords('AFBH1', records)
+        self.store.loadRecords('AFBH1', records[:10])
+        self.assertEqual(self.store.query(), records[:10])
+
+
+
+    def testQuery(self):
+        self.store.loadFolder(self.folder)
+        records = readFiles(self.folder)
+        htm = self.store.query(type='bond', accounting='htm', valuationDate='2018-04-30')
+        self.assertEqual(htm, [r for r in records if r['type'] == 'bond' \
+                                and r['accounting'] == 'htm'])
+        self.assertEqual(recordsToRows(htm)[0], list(htm[0].keys()))
+
+        position = self.store.query(portfolio=htm[0]['portfolio'], isin=htm[0]['isin'],
+                                    start='2018-01-01', end='2018-12-31')
+        self.assertEqual(position, [htm[0]])
+        self.assertEqual(self.store.query(start='2018-05-01'), [])
@@ -0,0 +1,52 @@
+# coding=utf-8
+# 
+
+import unittest2, shutil, tempfile
+from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.synthetic import writeReport, writeFolder
+from clamc_trustee.benchmark import runBenchmark, STAGES
+
+
+
+class TestSynthetic(unittest2.TestCase):
+    """
+    Synthetic trustee reports can be read like the real ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestSynthetic, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+
+
+    def testReport(self):
+        files = writeFolder(self.folder, 2, seed=1, bonds=30, lots=3, 
+                            equities=4, afsBonds=2, currencies=('HKD', 'USD', 'CNY'))
+        self.assertEqual(len(files), 2)
+        records = fileToRecords(files[0])
+        count = lambda t, a: len([r for r in records if (r['type'], r['accounting']) == (t, a)])
+        self.assertEqual(count('bond', 'htm'), 30)
+        self.assertEqual(count('bond', 'afs'), 2)
+        self.assertEqual(count('equity', 'afs'), 4)
+        self.assertEqual(count('cash', ''), 3)
+        self.assertTrue(all(r['valuation date'] == '2018-04-30' for r in records))
+
+        # same seed, same file
+        file = writeReport(self.folder + '/again.xls', seed=1, bonds=30)
+        self.assertEqual(fileToRecords(file), 
+                        fileToRecords(writeReport(self.folder + '/again2.xls', seed=1, bonds=30)))
+
+
+
+    def testBenchmark(self):
+        results = runBenchmark([5], files=2)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(set(results[0]['stages']), set(STAGES))
+        self.assertEqual(results[0]['stages']['consolidateRecords']['items'], 10)
@@ -0,0 +1,75 @@
+# coding=utf-8
+# 
+
+import unittest2
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.report import readFiles
+from clamc_trustee.trustee import recordsToRows
+from clamc_trustee.table import HoldingsTable, htmBond, cashOnly, \
+                                maskAnd, maskOr, maskNot
+
+
+
+class TestTable(unittest2.TestCase):
+    """
+    Filter records from two files in a holdings table.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestTable, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.records = readFiles(join(get_current_path(), 'samples', 'testfolder'))
+        self.table = HoldingsTable(self.records)
+
+
+
+    def testRecords(self):
+        self.assertEqual(len(self.table), len(self.records))
+        self.assertEqual(self.table.records(), self.records)
+
+
+
+    def testHtmBond(self):
+        htm = [r for r in self.records if (r['type'], r['accounting']) == ('bond', 'htm')]
+        mask = htmBond(self.table)
+        self.assertEqual(sum(mask), len(htm))
+        self.assertEqual(self.table.rows(mask=mask), recordsToRows(htm))
+
+
+
+    def testMasks(self):
+        table = self.table
+        usd = table.mask({'currency': 'USD'})
+        mask = maskAnd(htmBond(table), usd)
+        rows = table.rows(['isin', 'portfolio', 'amortized cost'], mask)
+        self.assertEqual(rows[0], ['isin', 'portfolio', 'amortized cost'])
+        self.assertEqual(len(rows)-1, 
+            len([r for r in self.records if r['type'] == 'bond' and \
+                r['accounting'] == 'htm' and r['currency'] == 'USD']))
+
+        self.assertEqual(maskOr(usd, maskNot(usd)), bytes([1])*len(table))
+        self.assertEqual(sum(cashOnly(table)), 
+            len([r for r in self.records if r['type'] == 'cash']))
+        self.assertEqual(sum(table.mask({'portfolio': ('12229', '12734')})), 
+                        len(table))
+
+
+
+    def testEmpty(self):
+        """
+        A mask on a column that no record has selects nothing, like the
+        filters on records.
+        """
+        table = HoldingsTable([])
+        self.assertEqual(htmBond(table), b'')
+        self.assertEqual(table.rows(mask=htmBond(table)), [[]])
+        self.assertEqual(table.records(), [])
+
+        table = HoldingsTable([{'type': 'bond', 'quantity': 1.0}])
+        self.assertEqual(htmBond(table), bytes([0]))
+        self.assertEqual(cashOnly(table), bytes([0]))
+        self.assertEqual(table.mask({'type': 'bond'}), bytes([1]))
+        self.assertEqual(table.column('accounting'), [None])
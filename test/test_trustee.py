@@ -3,7 +3,11 @@
 
 import unittest2, os
 from clamc_trustee.utility import get_current_path
-from clamc_trustee.trustee import fileToRecords
+from clamc_trustee.trustee import fileToRecords, iterFileRecords, fileToLines, \
+                                linesToSections, compileExtractor, mapHeaders, \
+                                recordFields, makeExtractor, parseSections, \
+                                sectionToRecords
+import types
 
 
 
@@ -63,6 +67,67 @@ class TestTrustee(unittest2.TestCase):
 
 
 
+    def testIterRecords(self):
+        file = os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_CGFB 1804.xls')
+        records = iterFileRecords(file)
+        self.assertTrue(isinstance(records, types.GeneratorType))
+        self.assertEqual(list(records), fileToRecords(file))
+
+
+
+    def testSections(self):
+        """
+        Sections from linesToSections() give the same records as the single
+        pass parser, the last section (accruals) is not used by either.
+        """
+        file = os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_CGFB 1804.xls')
+        lines = fileToLines(file, True)
+        parsed = [section[2:] for section in parseSections(lines)]
+        self.assertEqual([sectionToRecords(s) for s in linesToSections(lines)[1:]]
+                        , [(r, t, a) for (t, a, r) in parsed])
+
+
+
+    def testExtractor(self):
+        """
+        An extractor takes each field from its column, in the order of the
+        columns, and is made once per layout.
+        """
+        file = os.path.join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_CGFB 1804.xls')
+        sections = linesToSections(fileToLines(file, True))[1:-1]
+        extractors = set()
+        for section in sections:
+            i = [k for (k, line) in enumerate(section) if line[0].startswith('Description')][0]
+            extractor = compileExtractor(*section[i-2:i+1])
+            fields = recordFields(mapHeaders(*section[i-2:i+1]))
+            self.assertTrue(extractor is compileExtractor(*[list(line) for line in section[i-2:i+1]]))
+            extractors.add(extractor)
+            for line in section[i+1:-1]:
+                record = extractor('bond', 'htm', line)
+                self.assertEqual(list(record), [h for (i, h) in fields] + ['type', 'accounting'])
+                self.assertEqual((record['type'], record['accounting']), ('bond', 'htm'))
+                for (i, h) in fields:
+                    if h == 'percentage of fund':
+                        self.assertAlmostEqual(record[h], line[i] * 100)
+                    else:
+                        self.assertEqual(record[h], line[i])
+
+        self.assertTrue(len(extractors) < len(sections))
+        with self.assertRaises(KeyError):
+            compileExtractor(['Unknown'], [''], [''])
+
+
+
+    def testExtractorOneField(self):
+        extractor = makeExtractor(['', 'description', ''])
+        self.assertEqual(extractor('cash', '', ['', 'Cash HKD', 1.5]),
+                        {'description': 'Cash HKD', 'type': 'cash', 'accounting': ''})
+
+
+
     def verifyBond1(self, record):
         """
         first bond in USD HTM bond section,
@@ -0,0 +1,83 @@
+# coding=utf-8
+# 
+
+import unittest2, csv, shutil, tempfile
+from os.path import join
+from clamc_trustee.tscf import writeUpload, recordEmissions, tscfRow, \
+                                DeltaFilter
+
+
+
+class TestTSCF(unittest2.TestCase):
+    """
+    Write TSCF upload files from emissions.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestTSCF, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+
+    def testRecordEmissions(self):
+        records = [ {'isin': 'XS0000000001', 'portfolio': '12229',
+                     'amortized cost': 99.5, 'yield at cost': 4.2}
+                  , {'isin': 'XS0000000002', 'portfolio': '12366',
+                     'amortized cost': 101, 'yield at cost': 3.9}
+                  ]
+        emissions = list(recordEmissions(iter(records),
+                            [('CD012', 'amortized cost'), ('CD021', 'yield at cost')]))
+        self.assertEqual(emissions, 
+            [ ('CD012', 'XS0000000001', '12229', 99.5)
+            , ('CD021', 'XS0000000001', '12229', 4.2)
+            , ('CD012', 'XS0000000002', '12366', 101)
+            , ('CD021', 'XS0000000002', '12366', 3.9)
+            ])
+        self.assertEqual(tscfRow(emissions[0]), 
+                         ['CD012', 4, 'XS0000000001', '12229', 99.5, 99.5])
+
+
+
+    def testWriteUpload(self):
+        emissions = (('CD022', 'XS%010d' % i, '12229', i) for i in range(1000))
+        file = join(self.output, 'upload.inc')
+        self.assertEqual(writeUpload(file, emissions), 1000)
+        with open(file, newline='') as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(len(rows), 1002)
+        self.assertEqual(rows[0], ['Upload Method', 'INCREMENTAL', '', '', '', ''])
+        self.assertEqual(rows[1][0], 'Field Id')
+        self.assertEqual(rows[-1], ['CD022', '4', 'XS0000000999', '12229', '999', '999'])
+
+
+
+    def testDelta(self):
+        previous = { ('CD012', 'XS01', '12229'): 100.0
+                   , ('CD012', 'XS02', '12229'): 99.0
+                   , ('CD012', 'XS03', '12229'): 98.0
+                   , ('CD012', 'XS04', '12366'): 97.0
+                   }
+        emissions = [ ('CD012', 'XS01', '12229', 100.0000001)   # unchanged
+                    , ('CD012', 'XS02', '12229', 99.5)          # changed
+                    , ('CD012', 'XS05', '12229', 101.0)         # added
+                    ]                                           # XS03 removed
+        delta = DeltaFilter(previous, 1e-6)
+        self.assertEqual(list(delta(emissions)), emissions[1:])
+        self.assertEqual(delta.counts, {'added': 1, 'changed': 1, 
+                                        'unchanged': 1, 'removed': 1})
+        self.assertEqual([e[:3] for e in delta.heldBack], 
+                         [('unchanged', 'CD012', 'XS01'), ('removed', 'CD012', 'XS03')])
+
+        file = join(self.output, 'summary.csv')
+        delta.writeSummary(file)
+        with open(file, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[3], ['Unchanged', '1'])
+        self.assertEqual(rows[-1], ['removed', 'CD012', 'XS03', '12229', '98.0', ''])
@@ -0,0 +1,87 @@
+# coding=utf-8
+#
+
+import unittest2
+from datetime import datetime
+from os.path import join
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.xldate import DateConverter, dateConverter, convertColumns
+from clamc_trustee.trustee import fileToRecords, modifyDates
+
+
+
+class TestXldate(unittest2.TestCase):
+    """
+    Convert Excel date serials.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestXldate, self).__init__(*args, **kwargs)
+
+
+    def testConverter(self):
+        convert = DateConverter()
+        self.assertEqual(convert(43194.0), '2018-4-4')
+        self.assertEqual(convert(43144.75), '2018-2-13')
+        self.assertEqual(convert.column([43194.0, 43144.0, 43194.0]),
+                            ['2018-4-4', '2018-2-13', '2018-4-4'])
+        self.assertEqual(len(convert.table), 3)
+
+
+    def testSameAsBefore(self):
+        """
+        The default format is what modifyDates() gave before the table.
+        """
+        def ordinalToString(ordinal):
+            dt = datetime.fromordinal(datetime(1900, 1, 1).toordinal() + int(ordinal) - 2)
+            return str(dt.year) + '-' + str(dt.month) + '-' + str(dt.day)
+
+        convert = DateConverter()
+        for serial in range(61, 80000, 97):
+            self.assertEqual(convert(float(serial)), ordinalToString(serial))
+
+
+    def testIso(self):
+        convert = DateConverter(iso=True)
+        self.assertEqual(convert(43144.0), '2018-02-13')
+        self.assertEqual(convert(2958465.0), '9999-12-31')
+
+
+    def testDatemode(self):
+        self.assertEqual(DateConverter(1)(0.0), '1904-1-1')
+        self.assertEqual(DateConverter(1, True)(41682.0), '2018-02-13')
+        with self.assertRaises(ValueError):
+            DateConverter(2)
+
+
+    def testShared(self):
+        self.assertTrue(dateConverter(0, True) is dateConverter(0, True))
+        self.assertFalse(dateConverter(0, True) is dateConverter(0, False))
+
+
+    def testColumns(self):
+        records = [ {'maturity': 43194.0, 'interest start day': 43144.0}
+                  , {'maturity': 43194.0}
+                  , {'description': 'cash'}
+                  ]
+        convertColumns(records, ['interest start day', 'maturity'], DateConverter(iso=True))
+        self.assertEqual(records, [ {'maturity': '2018-04-04', 'interest start day': '2018-02-13'}
+                                  , {'maturity': '2018-04-04'}
+                                  , {'description': 'cash'}
+                                  ])
+        self.assertEqual(modifyDates({'maturity': 43194.0}), {'maturity': '2018-4-4'})
+
+
+    def testIsoRecords(self):
+        file = join(get_current_path(), 'samples', 
+                    '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        records = fileToRecords(file)
+        isoRecords = fileToRecords(file, isoDates=True)
+        self.assertEqual(len(records), len(isoRecords))
+        for (r1, r2) in zip(records, isoRecords):
+            if 'maturity' in r1:
+                self.assertEqual(r1['maturity'].split('-'), 
+                                [str(int(x)) for x in r2['maturity'].split('-')])
+                self.assertEqual(len(r2['maturity']), 10)
+            else:
+                self.assertEqual(r1, r2)
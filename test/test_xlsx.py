@@ -0,0 +1,158 @@
+# coding=utf-8
+#
+
+import unittest2, os, shutil, tempfile
+from os.path import join
+from zipfile import ZipFile
+from xml.sax.saxutils import escape
+from xlrd import open_workbook
+from clamc_trustee.utility import get_current_path
+from clamc_trustee.xlsx import xlsxRows, xlsxDatemode, columnIndex
+from clamc_trustee.trustee import fileToLines, fileToRecords
+
+
+
+class TestXlsx(unittest2.TestCase):
+    """
+    Stream rows of the first worksheet of an xlsx file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TestXlsx, self).__init__(*args, **kwargs)
+
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+
+    def testTaxLot(self):
+        file = join(get_current_path(), 'samples', 'test_historical',
+                    '12229 tax lot 201906.xlsx')
+        ws = open_workbook(file).sheet_by_index(0)
+        lines = list(xlsxRows(file))
+        self.assertEqual(len(lines), ws.nrows)
+        for (i, line) in enumerate(lines):
+            self.assertEqual(line, ws.row_values(i))
+
+
+
+    def testHistorical(self):
+        file = join(get_current_path(), 'samples', 'test_historical',
+                    'CLO Holdings 2019.06.28.xlsx')
+        ws = open_workbook(file).sheet_by_index(0)
+        lines = list(xlsxRows(file))
+        self.assertEqual(len(lines), ws.nrows)
+        self.assertEqual(['ISIN', 'Purchase Cost', 'Yield at Cost'], lines[0][:3])
+        for (i, line) in enumerate(lines):
+            # the worksheet dimension is wider than the columns in use
+            self.assertEqual(line[:ws.ncols], ws.row_values(i))
+            self.assertTrue(all(v == '' for v in line[ws.ncols:]))
+
+
+
+    def testTrusteeFile(self):
+        """
+        The same records from a trustee file saved as xlsx.
+        """
+        file = join(get_current_path(), 'samples',
+                    '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        xlsxFile = join(self.output, 'AFBH1.xlsx')
+        writeXlsx(xlsxFile, fileToLines(file))
+        self.assertEqual(fileToRecords(xlsxFile), fileToRecords(file))
+
+
+
+    def testNoDimension(self):
+        """
+        Without <dimension> and row numbers, lines are still as wide as the
+        widest row before them, and empty rows keep their place.
+        """
+        file = join(get_current_path(), 'samples',
+                    '00._Portfolio_Consolidation_Report_AFBH1 1804.xls')
+        xlsxFile = join(self.output, 'AFBH1.xlsx')
+        writeXlsx(xlsxFile, fileToLines(file), dimension=False, rowNumbers=False)
+        self.assertEqual(fileToRecords(xlsxFile), fileToRecords(file))
+
+        writeXlsx(xlsxFile, [['a', '', 'b'], [''], ['c'], ['', 'd', '', '', 'e'], ['f']],
+                  dimension=False, rowNumbers=False)
+        self.assertEqual(list(xlsxRows(xlsxFile)),
+            [['a', '', 'b'], ['', '', ''], ['c', '', ''], ['', 'd', '', '', 'e']
+            , ['f', '', '', '', '']])
+
+
+
+    def testSheet(self):
+        file = join(get_current_path(), 'samples', 'test_historical',
+                    '12229 tax lot 201906.xlsx')
+        self.assertEqual(list(xlsxRows(file, 'Report Tax Lot Appraisal with A')),
+                         list(xlsxRows(file)))
+        with self.assertRaises(IndexError):
+            list(xlsxRows(file, 1))
+
+
+
+    def testDatemode(self):
+        file = join(get_current_path(), 'samples', 'test_historical',
+                    '12229 tax lot 201906.xlsx')
+        self.assertEqual(xlsxDatemode(file), open_workbook(file).datemode)
+        file = join(self.output, '1904.xlsx')
+        writeXlsx(file, [['maturity'], [43194.0]], date1904=True)
+        self.assertEqual(xlsxDatemode(file), 1)
+
+
+    def testColumnIndex(self):
+        self.assertEqual(columnIndex('A1'), 0)
+        self.assertEqual(columnIndex('Z10'), 25)
+        self.assertEqual(columnIndex('AB12'), 27)
+
+
+
+def writeXlsx(fileName, lines, date1904=False, dimension=True, rowNumbers=True):
+    """
+    Write lines to a minimal xlsx file, text as inline strings, empty
+    strings as missing cells. The <dimension> and the row numbers ('r' of
+    <row>) are optional in a worksheet, they can be left out.
+    """
+    def cell(row, column, value):
+        reference = columnName(column) + str(row+1)
+        if isinstance(value, str):
+            return '<c r="{0}" t="inlineStr"><is><t xml:space="preserve">{1}'\
+                    '</t></is></c>'.format(reference, escape(value))
+        return '<c r="{0}"><v>{1!r}</v></c>'.format(reference, value)
+
+    def row(i, line):
+        return '<row{0}>{1}</row>'.format(' r="{0}"'.format(i+1) if rowNumbers else '',
+                    ''.join(cell(i, j, v) for (j, v) in enumerate(line) if v != ''))
+
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    dimension = '<dimension ref="A1:{0}{1}"/>'.format(columnName(max(map(len, lines))-1),
+                    len(lines)) if dimension else ''
+    with ZipFile(fileName, 'w') as z:
+        z.writestr('xl/workbook.xml', '<workbook xmlns="{0}" xmlns:r="{1}">'
+                    '{2}<sheets><sheet name="s" sheetId="1" r:id="rId1"/></sheets>'
+                    '</workbook>'.format(main, rel, 
+                        '<workbookPr date1904="1"/>' if date1904 else ''))
+        z.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns='
+                    '"http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="{0}/worksheet" '
+                    'Target="worksheets/sheet1.xml"/></Relationships>'.format(rel))
+        z.writestr('xl/worksheets/sheet1.xml', '<worksheet xmlns="{0}">'
+                    '{1}<sheetData>{2}</sheetData></worksheet>'\
+                    .format(main, dimension, ''.join(row(i, line) \
+                                                for (i, line) in enumerate(lines))))
+
+
+
+def columnName(column):
+    name = ''
+    column = column + 1
+    while column > 0:
+        column, remainder = divmod(column - 1, 26)
+        name = chr(65 + remainder) + name
+
+    return name
@@ -9,40 +9,164 @@
 # report.py
 #
 
-from xlrd import open_workbook
+from clamc_trustee.sheet import fileRows, workbookRows, compactLines
+from clamc_trustee.instrument import stage, timed
+from clamc_trustee.xldate import dateConverter, convertColumns
+from clamc_trustee.aggregate import aggregateGroups
 from functools import reduce
-from itertools import chain
-from datetime import datetime
-import csv, re
+from itertools import takewhile
+from operator import itemgetter
+import re
 
 import logging
 logger = logging.getLogger(__name__)
 
 
 
-def fileToRecords(fileName):
+# portfolio name in the file => portfolio id
+idMap = {
+	'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond) - Par': '12229',
+	'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)': '12734',
+	'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond)': '12366',
+	'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond) - Par': '12549',
+	'CLT-CLI HK BR (Class A-HK) Trust Fund - Par': '11490',
+	'CLI Macau BR (Fund)': '12298',
+	'CLI HK BR (Class G-HK) Trust Fund (Sub-Fund-Bond)': '12630',
+	'CLI HK BR (Class G-HK) Trust Fund': '12341'
+}
+
+
+
+# field name (3 header lines joined together) => header of the record
+headerMap = {
+	'': '',
+
+	# for HTM bond
+	'項目 Description': 'description',
+	'幣值 CCY': 'currency',
+	'票面值 Par Amt': 'quantity',
+	'利率 Interest Rate%': 'coupon',
+	'Interest Start Day': 'interest start day',
+	'到期日 Maturity': 'maturity',
+	'平均成本 Avg Cost': 'average cost',
+	'修正價 Amortized Price': 'amortized cost',
+	'成本 Cost': 'total cost',
+	'應收利息 Accr. Int.': 'accrued interest',
+	'Total Amortized Value': 'total amortized cost',
+	'P/L A. Value': 'total amortized gain loss',
+	'成本 Cost HKD': 'total cost HKD',
+	'應收利息 Acc. Int. HKD': 'accrued interest HKD',
+	'總攤銷值 Total A. Value HKD': 'total amortized cost HKD',
+	'盈/虧-攤銷值 P/L A. Value HKD': 'total amortized gain loss HKD',
+	'盈/虧-匯率 P/L FX HKD': 'FX gain loss HKD',
+	'百分比 % of Fund': 'percentage of fund',
+	'百份比 % of Fund': 'percentage of fund',
+
+	# for AFS bond
+	'市場現價 Market Price': 'market price',
+	'Total Mkt Value': 'total market value',
+	'P/L M. Value': 'market value gain loss',
+	'總市值 Total Mkt Value HKD': 'total market value HKD',
+	'盈/虧-市值 P/L M. Value HKD': 'market value gain loss HKD',
+
+	# for equity
+	'股數 Share': 'quantity',
+	'最近交易日 Latest T. D.': 'last trade day',
+	'成本價 Cost': 'total cost',
+	'應收紅利 Acc. Dividend': 'accrued dividend',
+	'Total M. Value': 'total market value',
+	'應收紅利 Acc. Dividend HKD': 'accrued dividend HKD',
+
+	# for cash
+	'項目 & 戶口號碼 Description & Account No.': 'description',
+	'Avg FX Rate': 'average FX rate',
+	'貨幣匯率 Ex Rate': 'portfolio FX rate',
+	'盈/虧-匯率 P/L FX HKD Equiv.': 'FX gain loss HKD'
+}
+
+
+
+# some bond identifiers are not ISIN, we then map them to ISIN
+bondIsinMap = {
+	'DBANFB12014':'HK0000175916',	# Dragon Days Ltd 6% 03/21/22
+	'HSBCFN13014':'HK0000163607'	# New World Development 6% Sept 2023
+}
+
+
+
+# version of the parsing logic, change it when fileToRecords() gives 
+# different records for the same file, so that cached records are not used.
+#
+# 2: dates of 1904 based workbooks follow the workbook's date mode
+# 3: consolidated values are summed with math.fsum
+PARSER_VERSION = 3
+
+
+
+# headers of bond and equity records that hold an Excel date
+DATE_HEADERS = ['interest start day', 'maturity', 'last trade day']
+
+# valuation period in the file, like 'Valuation Period: 01/04/2018 to 30/04/2018'
+VALUATION_PERIOD = re.compile(r'\d{2}/\d{2}/\d{4}\sto\s(\d{2}/\d{2}/\d{4})')
+
+
+
+def fileToRecords(fileName, sheet=0, isoDates=False):
 	"""
-	[string] full path to a file => [list] holding records in that file.
+	[string] full path to a file, [int or string] index or name of the
+		holding page, [Bool] isoDates => [list] holding records in that file.
+	"""
+	return list(iterFileRecords(fileName, sheet, isoDates))
+
+
+
+def iterFileRecords(fileName, sheet=0, isoDates=False):
+	"""
+	[string] full path to a file, [int or string] index or name of the
+		holding page, [Bool] isoDates => [generator] holding records in that
+		file.
+
+	Dates of bonds and equities are like '2018-2-13', or '2018-02-13' if 
+	isoDates is True, see modifyDates().
+
+	Records of a section are yielded as soon as that section is parsed, so
+	a caller that consumes them one by one never holds more than one file 
+	in memory.
+
+	Each step is measured as a stage, see instrument.py. The records of a
+	section are in a list already, the steps change them in place, so
+	nothing is copied for the sake of counting. The last step, addFileInfo,
+	sees every record of the file, so it counts the records given out.
 	"""
-	logger.info('fileToRecords(): {0}'.format(fileName))
-	sections = linesToSections(fileToLines(fileName))
-	valuationDate, portfolioId = fileInfo(sections[0])
-	totalRecords = []
-	for i in range(1, len(sections)):
-		records, sectionType, accounting = sectionToRecords(sections[i])
+	logger.info('iterFileRecords(): {0}'.format(fileName))
+	rows, datemode = workbookRows(fileName, True, sheet)
+	rows = timed(rows, 'fileRows', fileName, 'rows')
+	converter = dateConverter(datemode, isoDates)
+	for (valuationDate, portfolioId, sectionType, accounting, records) in \
+		timed(parseSections(rows), 'parseSections', fileName, 'sections'):
 		if (sectionType, accounting) == ('bond', 'htm'):
-			records = patchHtmBondRecords(records)
+			with stage('patchHtmBondRecords', fileName) as s:
+				patched = patchHtmBondRecords(records)
+				s.count(records=len(patched), merged=len(records)-len(patched))
+				records = patched
+
 		if sectionType in ('bond', 'equity'):
-			records = map(modifyDates, map(addIdentifier, records))
+			with stage('addIdentifier', fileName) as s:
+				for record in records:
+					addIdentifier(record)
+				s.count(records=len(records))
 
-		totalRecords = chain(totalRecords, records)
-	
-	def addPortfolioInfo(record):
-		record['portfolio'] = portfolioId
-		record['valuation date'] = valuationDate
-		return record
+			with stage('modifyDates', fileName) as s:
+				convertColumns(records, DATE_HEADERS, converter)
+				s.count(records=len(records))
+
+		with stage('addFileInfo', fileName) as s:
+			for record in records:
+				record['portfolio'] = portfolioId
+				record['valuation date'] = valuationDate
+			s.count(records=len(records))
 
-	return list(map(addPortfolioInfo, totalRecords))
+		yield from records
 
 
 
@@ -57,16 +181,6 @@ def fileInfo(lines):
 		"""
 		[string] text => [string] portfolio id
 		"""
-		idMap = {
-			'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond) - Par': '12229',
-			'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)': '12734',
-			'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond)': '12366',
-			'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond) - Par': '12549',
-			'CLT-CLI HK BR (Class A-HK) Trust Fund - Par': '11490',
-			'CLI Macau BR (Fund)': '12298',
-			'CLI HK BR (Class G-HK) Trust Fund (Sub-Fund-Bond)': '12630',
-			'CLI HK BR (Class G-HK) Trust Fund': '12341'
-		}
 		portfolioName = text.split(':')[1].strip()
 		try:
 			return idMap[portfolioName]
@@ -78,13 +192,13 @@ def fileInfo(lines):
 		"""
 		[string] text => [string] valuation date in 'yyyy-mm-dd' format 
 		"""
-		m = re.search('\d{2}/\d{2}/\d{4}\sto\s(\d{2}/\d{2}/\d{4})', text)
+		m = VALUATION_PERIOD.search(text)
 		if (m):
 			tokens = m.group(1).split('/')
 			return '{0}-{1}-{2}'.format(tokens[2], tokens[1], tokens[0])
 		else:
-			logger.error('getValuationDate(): cannot find date from \'{0}\'') \
-							.format(text)
+			logger.error('getValuationDate(): cannot find date from \'{0}\''\
+							.format(text))
 			raise ValueError
 	# end of getValuationDate()
 
@@ -98,37 +212,44 @@ def fileInfo(lines):
 
 
 
-def fileToLines(fileName):
+def readFileInfo(fileName, sheet=0):
+	"""
+	[string] full path to a file, [int or string] index or name of the
+		holding page => [string] valuation date, [string] portfolio id
+
+	Only the rows before the first section are used, an .xlsx file is read
+	no further than that.
+	"""
+	rows = fileRows(fileName, True, sheet)
+	try:
+		return fileInfo(list(takewhile(lambda row: not startOfSection(row), rows)))
+	finally:
+		rows.close()
+
+
+
+def fileToLines(fileName, skipBlank=False, sheet=0, compact=False):
 	"""
 	fileName: the file path to the trustee excel file.
+	skipBlank: leave out blank lines (see sheet.isBlankRow()).
+	sheet: index or name of the holding page.
+	compact: keep only the non empty cells of each line, with repeated text
+		kept once (see sheet.SparseLine), for lines held in memory.
 	
 	output: a list of lines, each line represents a row in the holding 
-		page of the excel file.
+		page of the excel file. An .xlsx file is read as a stream, see
+		sheet.fileRows(). The workbook is released once the lines are read.
 	"""
-	wb = open_workbook(filename=fileName)
-	ws = wb.sheet_by_index(0)
-	lines = []
-	row = 0
-	while row < ws.nrows:
-		thisRow = []
-		column = 0
-		while column < ws.ncols:
-			cellValue = ws.cell_value(row, column)
-			if isinstance(cellValue, str):
-				cellValue = cellValue.replace('\n', ' ')
-			thisRow.append(cellValue)
-			column = column + 1
-
-		lines.append(thisRow)
-		row = row + 1
-
-	return lines
+	rows = fileRows(fileName, skipBlank, sheet)
+	return list(compactLines(rows) if compact else rows)
 
 
 
-def linesToSections(lines):
+def linesToSections(lines, skipEmpty=True):
 	"""
 	lines: a list of lines representing an excel file.
+	skipEmpty: whether empty lines need to be filtered out, False if the
+		lines come from fileToLines(fileName, skipBlank=True).
 
 	output: a list of sections, each section being a list of lines in that
 		section.
@@ -140,26 +261,9 @@ def linesToSections(lines):
 
 		return False
 
-	def startOfSection(line):
-		"""
-		Tell whether the line represents the start of a section.
-
-		A section starts if the first element of the line starts like
-		this:
-
-		I. Cash - CNY xxx
-		IV. Debt Securities xxx
-		VIII. Accruals xxx
-		"""
-		if isinstance((line[0]), str) and re.match('[IVX]+\.\s+', line[0]):
-			return True
-		else:
-			return False
-	# end of startOfSection()
-
 	sections = []
 	tempSection = []
-	for line in filter(notEmptyLine, lines):
+	for line in filter(notEmptyLine, lines) if skipEmpty else lines:
 		if not startOfSection(line):
 			tempSection.append(line)
 		else:
@@ -170,257 +274,270 @@ def linesToSections(lines):
 
 
 
-def sectionToRecords(lines):
+SECTION_START = re.compile(r'[IVX]+\.\s+')
+
+SECTION_TYPES = ( (re.compile(r'\sCash\s'), 'cash')
+				, (re.compile(r'\sDebt Securities\s'), 'bond')
+				, (re.compile(r'\sEquities\s'), 'equity')
+				)
+
+ACCOUNTING_TYPES = ( (re.compile(r'\sHeld for Trading'), 'trading')
+				   , (re.compile(r'\sAvailable for Sales'), 'afs')
+				   , (re.compile(r'\sHeld for Maturity'), 'htm')
+				   )
+
+
+
+def startOfSection(line):
 	"""
-	lines: a list of lines representing the section
+	Tell whether the line represents the start of a section.
+
+	A section starts if the first element of the line starts like
+	this:
 
-	output: [iterable] position records (dictionary objects) in the section.
+	I. Cash - CNY xxx
+	IV. Debt Securities xxx
+	VIII. Accruals xxx
 	"""
-	def sectionInfo(line):
-		"""
-		line: the line at the beginning of the section
+	return isinstance(line[0], str) and SECTION_START.match(line[0]) is not None
 
-		output: return two item: type, accounting treatment,
-			type as a string, either 'cash', 'equity', 'bond' or empty string 
-				if not the above.
-			accounting treatment is either 'htm', 'trading', or empty string
-				if not the above.
-		"""
-		sectionType = ''
-		accounting = ''
-		if (re.search('\sCash\s', line[0])):
-			sectionType = 'cash'
-		elif (re.search('\sDebt Securities\s', line[0])):
-			sectionType = 'bond'
-		elif (re.search('\sEquities\s', line[0])):
-			sectionType = 'equity'
-
-		if (re.search('\sHeld for Trading', line[0])):
-			accounting = 'trading'
-		elif (re.search('\sAvailable for Sales', line[0])):
-			accounting = 'afs'
-		elif (re.search('\sHeld for Maturity', line[0])):
-			accounting = 'htm'
-
-		return sectionType, accounting
-	# end of sectionInfo()
-
-	def sectionHeaders(line1, line2, line3):
-		"""
-		line1, line2, line3: the three lines that hold the field names
-			of the holdings. They are assumed to be of equal length.
 
-		output: a list of headers that map the field names containing 
-			Chinese character, %, English letters to easy to understand
-			header names.
-		"""
-		def mapFieldName(fieldNameTuple):
-			return reduce(lambda x,y : (x+' '+y).strip(), fieldNameTuple)
-
-		headerMap = {
-			'': '',
-
-			# for HTM bond
-			'項目 Description': 'description',
-			'幣值 CCY': 'currency',
-			'票面值 Par Amt': 'quantity',
-			'利率 Interest Rate%': 'coupon',
-			'Interest Start Day': 'interest start day',
-			'到期日 Maturity': 'maturity',
-			'平均成本 Avg Cost': 'average cost',
-			'修正價 Amortized Price': 'amortized cost',
-			'成本 Cost': 'total cost',
-			'應收利息 Accr. Int.': 'accrued interest',
-			'Total Amortized Value': 'total amortized cost',
-			'P/L A. Value': 'total amortized gain loss',
-			'成本 Cost HKD': 'total cost HKD',
-			'應收利息 Acc. Int. HKD': 'accrued interest HKD',
-			'總攤銷值 Total A. Value HKD': 'total amortized cost HKD',
-			'盈/虧-攤銷值 P/L A. Value HKD': 'total amortized gain loss HKD',
-			'盈/虧-匯率 P/L FX HKD': 'FX gain loss HKD',
-			'百分比 % of Fund': 'percentage of fund',
-			'百份比 % of Fund': 'percentage of fund',
-
-			# for AFS bond
-			'市場現價 Market Price': 'market price',
-			'Total Mkt Value': 'total market value',
-			'P/L M. Value': 'market value gain loss',
-			'總市值 Total Mkt Value HKD': 'total market value HKD',
-			'盈/虧-市值 P/L M. Value HKD': 'market value gain loss HKD',
-
-			# for equity
-			'股數 Share': 'quantity',
-			'最近交易日 Latest T. D.': 'last trade day',
-			'成本價 Cost': 'total cost',
-			'應收紅利 Acc. Dividend': 'accrued dividend',
-			'Total M. Value': 'total market value',
-			'應收紅利 Acc. Dividend HKD': 'accrued dividend HKD',
-
-			# for cash
-			'項目 & 戶口號碼 Description & Account No.': 'description',
-			'Avg FX Rate': 'average FX rate',
-			'貨幣匯率 Ex Rate': 'portfolio FX rate',
-			'盈/虧-匯率 P/L FX HKD Equiv.': 'FX gain loss HKD'
-		}
-
-		def mapFieldNameToHeader(fieldName):
-			try:
-				return headerMap[fieldName]
-			except KeyError:
-				logger.error('invalid field name \'{0}\''.format(fieldName))
-				raise
-		# end of mapFieldNameToHeader
 
-		fieldNames = map(mapFieldName, zip(line1, line2, line3))
+def sectionInfo(line):
+	"""
+	line: the line at the beginning of the section
 
-		"""
-		Note: We must convert the headers (map object) to a list before 
-		returning it.
-		
-		As we need to iterate through the headers multiple times, without
-		the conversion, the headers will behave like an empty list because
-		a generator (map object) can only be iterate through once.
-		"""
-		return list(map(mapFieldNameToHeader, fieldNames))
-	# end of sectionHeaders()
+	output: return two item: type, accounting treatment,
+		type as a string, either 'cash', 'equity', 'bond' or empty string 
+			if not the above.
+		accounting treatment is either 'htm', 'trading', or empty string
+			if not the above.
+	"""
+	def firstMatch(patterns):
+		for (pattern, value) in patterns:
+			if pattern.search(line[0]):
+				return value
 
-	def findHeaderRowIndex(lines):
-		"""
-		lines: a list of lines representing the section
+		return ''
 
-		output: the index of the line in the lines that contain header 
-			'Description'.
-		"""
-		i = 0
-		while (not lines[i][0].startswith('Description')):
-			i = i + 1
+	return firstMatch(SECTION_TYPES), firstMatch(ACCOUNTING_TYPES)
 
-		return i
-	# end of findHeaderRowIndex()
 
-	def sectionRecords(headers, lines):
-		"""
-		headers: the list of headers
-		lines: the list of lines in the section containing the holding
-			records. Note the line representing summary of records (i.e., 
-			totals) is not included.
 
-		output: a list of records, each being a dictionary holding a position
-			record.
-		"""
-		def lineToRecord(line):
-			headerValuePairs = filter(lambda x: x[0] != '', zip(headers, line))
-			return {key: value for (key, value) in headerValuePairs}
-
-		return map(lineToRecord, lines)
-	# end of sectionRecords()
-
-	sectionType, accounting = sectionInfo(lines[0])
-	i = findHeaderRowIndex(lines)
-	headers = sectionHeaders(lines[i-2], lines[i-1], lines[i])
-
-	def modifyRecord(record):
-		record['type'] = sectionType
-		record['accounting'] = accounting
-		try:	# 2.5% is read in as 0.025, make it 2.5 again
-			record['percentage of fund'] = record['percentage of fund'] * 100
-		except KeyError:
-			pass
+def mapHeaders(line1, line2, line3):
+	"""
+	line1, line2, line3: the three lines that hold the field names
+		of the holdings. They are assumed to be of equal length.
+
+	output: a list of headers that map the field names containing 
+		Chinese character, %, English letters to easy to understand
+		header names. The KeyError holds the field name that is not in
+		headerMap.
+	"""
+	return [headerMap[((f1+' '+f2).strip()+' '+f3).strip()] \
+				for (f1, f2, f3) in zip(line1, line2, line3)]
+
 
+
+def recordFields(headers):
+	"""
+	[list] headers => [list] (column index, header) of the columns that go
+		into a record.
+	"""
+	return [(i, h) for (i, h) in enumerate(headers) if h != '']
+
+
+
+def makeExtractor(headers):
+	"""
+	[list] headers of the columns, see mapHeaders() => [function] section
+		type, accounting, line => record
+
+	The record has the fields of recordFields(), in the same order, then
+	the section type and accounting. The columns are picked up by one
+	itemgetter, so building a record is a single dict() call.
+	"""
+	fields = recordFields(headers)
+	names = tuple(h for (i, h) in fields)
+	columns = [i for (i, h) in fields]
+	if len(columns) == 1:	# itemgetter of one column does not give a tuple
+		column = columns[0]
+		getter = lambda line: (line[column],)
+	else:
+		getter = itemgetter(*columns)
+
+	if not 'percentage of fund' in names:
+		return lambda t, a, line: dict(zip(names, getter(line)), type=t, accounting=a)
+
+	def extract(t, a, line):
+		record = dict(zip(names, getter(line)), type=t, accounting=a)
+		# 2.5% is read in as 0.025, make it 2.5 again
+		record['percentage of fund'] = record['percentage of fund'] * 100
 		return record
 
-	return map(modifyRecord, sectionRecords(headers, lines[i+1:-1])), \
-			sectionType, accounting
+	return extract
 
 
 
-def patchHtmBondRecords(records):
+"""
+fingerprint of the 3 header lines => extractor, see makeExtractor(). Trustee
+files use a few layouts (HTM bond, AFS bond, equity, cash) over and over, so
+after the first file, header lines are not mapped again.
+"""
+_extractors = {}
+MAX_EXTRACTORS = 256
+
+def compileExtractor(line1, line2, line3):
 	"""
-	records: a list of HTM bond records. On some portfolio, there are 
-		multiple records of the same HTM bond. Only the first one has
-		description and currency fields filled, the rest have these two
-		fields empty.
+	[list] line1, line2, line3 => [function] extractor for the header lines,
+		the KeyError holds the field name that is not in headerMap, see
+		mapHeaders().
+	"""
+	fingerprint = (tuple(line1), tuple(line2), tuple(line3))
+	try:
+		return _extractors[fingerprint]
+	except KeyError:
+		pass
 
-	output: [iterable] records with:
+	extractor = makeExtractor(mapHeaders(line1, line2, line3))
+	if len(_extractors) >= MAX_EXTRACTORS:	# not trustee files, start over
+		_extractors.clear()
+	return _extractors.setdefault(fingerprint, extractor)
 
-	1. description and currency fields filled.
-	2. multiple records on the same bond consolidated into one.
+
+
+def sectionToRecords(lines):
 	"""
-	def recordsToGroups(groups, record):
-		"""
-		Divided the records into sub groups, each group containing records
-		of the same bond.
-		"""
-		if (record['description'] == ''):
-			groups[-1].append(record)
-		else:
-			groups.append([record])
+	lines: a list of lines representing the section
 
-		return groups
-	# end of recordsToGroups()
+	output: [list] position records (dictionary objects) in the section,
+		section type, accounting.
 
-	return map(groupToRecord, reduce(recordsToGroups, records, []))
+	The lines go through a SectionParser, the same as in parseSections(),
+	so the line representing summary of records (i.e., totals) at the end
+	of the section is not included.
+	"""
+	section = SectionParser(lines[0])
+	for line in lines[1:]:
+		section.add(line)
+
+	sectionType, accounting, records = section.finish()
+	return records, sectionType, accounting
 
 
 
-def groupToRecord(group):
+def parseSections(rows):
 	"""
-	group: a list object, consisting of records of the same type, i.e.,
-		htm bond, afs bond or equity. Cash is not considered.
+	[iterable] rows => [generator] (valuation date, portfolio id, section
+		type, accounting, records) of each section.
 
-	output: a single record, consolidated from the group of records.
+	A single pass over the non-blank rows of a trustee file, giving the same
+	sections and records as linesToSections() followed by sectionToRecords(),
+	without keeping the lines of the file.
+
+	Rows before the first section go to fileInfo(). Records of a section are
+	yielded when the next section starts, so like linesToSections(), the 
+	last section (accruals) is not used.
 	"""
-	# print(group)
-	if (len(group) == 1):
-		return group[0]
+	preamble = []
+	section = None
+	for row in rows:
+		if startOfSection(row):
+			if section is None:
+				valuationDate, portfolioId = fileInfo(preamble)
+			else:
+				yield (valuationDate, portfolioId) + section.finish()
+			section = SectionParser(row)
+		elif section is None:
+			preamble.append(row)
+		else:
+			section.add(row)
 
-	headers = list(group[0].keys())
-	def toValueList(record):
-		return [record[header] for header in headers]
 
-	# say there are 3 records in the group, for each header, there are 
-	# 3 values. we group them as a tuple (v1, v2, v3). For all the headers, 
-	# we form a list [(a1, a2, a3), (b1, b2, b3), ...], where (a1, a2, a3) 
-	# for header a, (b1, b2, b3) for header b, etc.
-	valueTuples = list(zip(*map(toValueList, group)))
 
-	def groupWeight(quantTuple):
+class SectionParser():
+	"""
+	State of a section in parseSections() and sectionToRecords().
+
+	Before the 'Description' line is found, the last two lines are kept for
+	the section headers. After that, a line becomes a record when the next
+	line arrives, so the last line of the section (the total) is left out.
+
+	Errors in the headers are raised by finish(), so that they do not stop
+	the parsing of the last section, which is not used.
+	"""
+	def __init__(self, title):
+		self.title = title
+		self.sectionType, self.accounting = sectionInfo(title)
+		self.lastLines = [title]
+		self.extractor = None
+		self.error = None
+		self.pending = None
+		self.records = []
+
+
+	def add(self, line):
+		if self.extractor is not None:
+			if self.pending is not None:
+				self.records.append(self.extractor(self.sectionType,
+										self.accounting, self.pending))
+			self.pending = line
+		elif self.error is not None:
+			pass
+		elif isinstance(line[0], str) and line[0].startswith('Description'):
+			try:
+				self.extractor = compileExtractor(self.lastLines[-2],
+											self.lastLines[-1], line)
+			except (KeyError, IndexError) as e:
+				self.error = e
+		else:
+			self.lastLines = self.lastLines[-1:] + [line]
+
+
+	def finish(self):
 		"""
-		quantTuple: the tuple containing quantities of each record in
-			the group.
+		=> [tuple] section type, accounting, [list] records
+		"""
+		if isinstance(self.error, KeyError):
+			logger.error('invalid field name \'{0}\''.format(self.error.args[0]))
+			raise self.error
+		if self.extractor is None:
+			logger.error('SectionParser(): no headers in section \'{0}\''\
+							.format(self.title[0]))
+			raise ValueError
+
+		return self.sectionType, self.accounting, self.records
+
+
+
+def patchHtmBondRecords(records):
+	"""
+	records: a list of HTM bond records. On some portfolio, there are 
+		multiple records of the same HTM bond. Only the first one has
+		description and currency fields filled, the rest have these two
+		fields empty.
+
+	output: [list] records with:
 
-		output: the weight of each record based on their quantity, as
-			a list.
+	1. description and currency fields filled.
+	2. multiple records on the same bond consolidated into one, see
+		aggregate.HOLDING_RULES.
+	"""
+	def sameBond(ids, record):
 		"""
-		totalQuantity = reduce(lambda x,y: x+y, quantTuple, 0)
-		return list(map(lambda x: x/totalQuantity, quantTuple))
-	# end of groupWeight()
-
-	weights = groupWeight(valueTuples[headers.index('quantity')])
-
-	def weightedAverage(valueTuple):
-		return reduce(lambda x,y: x+y[0]*y[1], zip(weights, valueTuple), 0)
-		
-	def sumUp(valueTuple):
-		return reduce(lambda x,y: x+y, valueTuple, 0)
-
-	def takeFirst(valueTuple):
-		return valueTuple[0]
-
-	assert abs(sumUp(weights)-1) < 0.000001, 'invalid weights {0}'.format(weights)
-	record = {}
-	for (header, valueTuple) in zip(headers, valueTuples):
-		# print(header)
-		if header in ['maturity', 'coupon', 'interest start day', 'market price',
-						'type', 'currency', 'accounting', 'description', 'isin',
-						'valuation date']:
-			record[header] = takeFirst(valueTuple)
-		elif header in ['average cost', 'amortized cost']:
-			record[header] = weightedAverage(valueTuple)
+		A record without description belongs to the bond before it.
+		"""
+		if record['description'] == '' and ids != []:
+			ids.append(ids[-1])
 		else:
-			record[header] = sumUp(valueTuple)
+			ids.append(ids[-1] + 1 if ids != [] else 0)
 
-	return record
+		return ids
+	# end of sameBond()
+
+	records = list(records)
+	ids = reduce(sameBond, records, [])
+	return aggregateGroups(records, ids, ids[-1] + 1 if ids != [] else 0)
 
 
 
@@ -433,11 +550,6 @@ def addIdentifier(record):
 	"""
 	identifier = record['description'].split()[0]
 	
-	# some bond identifiers are not ISIN, we then map them to ISIN
-	bondIsinMap = {
-		'DBANFB12014':'HK0000175916',	# Dragon Days Ltd 6% 03/21/22
-		'HSBCFN13014':'HK0000163607'	# New World Development 6% Sept 2023
-	}
 	if record['type'] == 'bond':
 		try:
 			identifier = bondIsinMap[identifier]
@@ -454,26 +566,25 @@ def addIdentifier(record):
 
 	
 
-def modifyDates(record):
+def modifyDates(record, converter=None):
 	"""
 	record: a bond or record position which has fields that hold a date,
 		such as interest start day, maturity date, or trade day. But those
 		dates hold an Excel ordinal value like 43194.0 (float).
 
+	converter: turns the ordinal to a string, see xldate.py, by default
+		1900 based dates without padding.
+
 	output: the record with the date value changed to a string representation,
 		in the form of 'yyyy-mm-dd'
-	"""
-	def ordinalToDate(ordinal):
-		# from: https://stackoverflow.com/a/31359287
-		return datetime.fromordinal(datetime(1900, 1, 1).toordinal() + 
-										int(ordinal) - 2)
-
-	def dateToString(dt):
-		return str(dt.year) + '-' + str(dt.month) + '-' + str(dt.day)
 
-	for header in ['interest start day', 'maturity', 'last trade day']:
+	iterFileRecords() converts the dates of all records of a section at once
+	instead, see xldate.convertColumns().
+	"""
+	converter = dateConverter() if converter is None else converter
+	for header in DATE_HEADERS:
 		try:
-			record[header] = dateToString(ordinalToDate(record[header]))
+			record[header] = converter(record[header])
 		except KeyError:
 			pass
 
@@ -501,6 +612,7 @@ def recordsToRows(records):
 
 
 def writeCsv(fileName, rows):
+	import csv
 	with open(fileName, 'w', newline='') as csvfile:
 		file_writer = csv.writer(csvfile)
 		for row in rows:
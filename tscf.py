@@ -0,0 +1,190 @@
+# coding=utf-8
+#
+# Write Bloomberg AIM TSCF upload files.
+#
+# A TSCF upload file looks like below:
+#
+# Upload Method,INCREMENTAL,,,,
+# Field Id,Security Id Type,Security Id,Account Code,Numeric Value,Char Value
+# CD012,4,XS1234567890,12229,100.5,100.5
+# CD022,4,HK0000171949,12229,98.89,98.89
+# CD021,4,HK0000171949,12229,6.535,6.535
+# ...
+#
+# Every source (trustee records, historical cost data, etc.) gives a stream
+# of emissions, each being a tuple (field id, security id, account, value).
+# writeUpload() turns them into rows one by one and writes them, so the
+# upload is never held in memory. The field ids used are:
+#
+# CD012: amortized cost (trustee reports, see report.py)
+# CD021: yield at cost (see hcost.py)
+# CD022: purchase cost (see hcost.py)
+#
+# An upload can be made a delta of the previous upload: DeltaFilter passes
+# only emissions that are new, or whose value moved by more than a
+# tolerance, and writes a summary of what it held back. The previous upload
+# it compares with must have all the rows (see report.writeTSCFFromRecords(),
+# which keeps a full file next to each delta).
+#
+
+from clamc_trustee.trustee import writeCsv
+from clamc_trustee.instrument import stage
+from itertools import chain
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+HEAD_ROWS = [ ['Upload Method', 'INCREMENTAL', '', '', '', '']
+			, [ 'Field Id', 'Security Id Type', 'Security Id', 'Account Code'
+			  , 'Numeric Value', 'Char Value']
+			]
+
+ISIN = 4	# security id type
+
+
+
+def writeUpload(fileName, emissions):
+	"""
+	[string] file name, [iterable] emissions => [int] number of rows written
+		after the head rows.
+	"""
+	with stage('writeUpload', fileName) as s:
+		counter = Counter()
+		writeCsv(fileName, chain(HEAD_ROWS, map(counter, map(tscfRow, emissions))))
+		s.count(rows=counter.count)
+
+	return counter.count
+
+
+
+def tscfRow(emission):
+	"""
+	[tuple] (field id, security id, account, value) => [list] TSCF row
+	"""
+	fieldId, securityId, account, value = emission
+	return [fieldId, ISIN, securityId, account, value, value]
+
+
+
+def recordEmissions(records, fields):
+	"""
+	[iterable] records, [list] (field id, header) => [generator] emissions
+
+	One pass over the records, emitting every field of a record before
+	moving to the next record. For example, the amortized cost of holding
+	records:
+
+	recordEmissions(records, [('CD012', 'amortized cost')])
+	"""
+	for record in records:
+		for (fieldId, header) in fields:
+			yield (fieldId, record['isin'], record['portfolio'], record[header])
+
+
+
+class Counter():
+	"""
+	Count the items going through it, used as a function in map().
+	"""
+	def __init__(self):
+		self.count = 0
+
+
+	def __call__(self, item):
+		self.count = self.count + 1
+		return item
+
+
+
+def readUpload(fileName):
+	"""
+	[string] upload file => [dictionary] (field id, security id, account)
+		=> value, numbers as floats.
+	"""
+	import csv
+	with open(fileName, newline='') as f:
+		rows = csv.reader(f)
+		for row in rows:	# skip the head rows
+			if row[:1] == ['Field Id']:
+				break
+
+		return {(row[0], row[2], row[3]): toNumber(row[4]) for row in rows if len(row) > 4}
+
+
+
+def toNumber(text):
+	try:
+		return float(text)
+	except ValueError:
+		return text
+
+
+
+class DeltaFilter():
+	"""
+	Compare emissions with the entries of a previous upload (see
+	readUpload()), and pass only those that are added or changed. An entry
+	changes if its value moves by more than tolerance (for numbers) or is
+	different (otherwise).
+
+	Entries held back (unchanged), and previous entries of the same field
+	and account that are not emitted any more (removed, an incremental
+	upload cannot remove them), are kept for the summary. For example,
+
+	delta = DeltaFilter(readUpload(lastFullFile), 1e-6)
+	writeUpload(newFile, delta(emissions))
+	delta.writeSummary(summaryFile)
+	"""
+	def __init__(self, previous, tolerance=0):
+		self.previous = previous
+		self.tolerance = tolerance
+		self.counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+		self.heldBack = []		# (status, field id, security id, account, 
+								#  previous value, value)
+
+
+	def __call__(self, emissions):
+		seen = set()
+		for emission in emissions:
+			fieldId, securityId, account, value = emission
+			key = (fieldId, securityId, account)
+			seen.add(key)
+			status = self.status(key, value)
+			self.counts[status] = self.counts[status] + 1
+			if status == 'unchanged':
+				self.heldBack.append((status,) + key + (self.previous[key], value))
+			else:
+				yield emission
+
+		fieldAccounts = set((k[0], k[2]) for k in seen)
+		for key in sorted(self.previous):
+			if not key in seen and (key[0], key[2]) in fieldAccounts:
+				self.counts['removed'] = self.counts['removed'] + 1
+				self.heldBack.append(('removed',) + key + (self.previous[key], ''))
+
+
+	def status(self, key, value):
+		try:
+			old = self.previous[key]
+		except KeyError:
+			return 'added'
+
+		if isinstance(old, float) and isinstance(value, (int, float)):
+			return 'changed' if abs(old - value) > self.tolerance else 'unchanged'
+
+		return 'changed' if old != value else 'unchanged'
+
+
+	def writeSummary(self, fileName):
+		"""
+		[string] file name => write a csv with the counts, then the entries
+			held back.
+		"""
+		writeCsv(fileName, chain(
+			  [['Tolerance', self.tolerance]]
+			, ([status.capitalize(), count] for (status, count) in self.counts.items())
+			, [[], ['Status', 'Field Id', 'Security Id', 'Account Code'
+				   , 'Previous Value', 'New Value']]
+			, map(list, self.heldBack)
+			))
@@ -0,0 +1,101 @@
+# coding=utf-8
+#
+# Turn Excel date serials (like 43194.0) into date strings.
+#
+# A date column of a trustee file holds the same few dates over and over
+# (maturities, interest start days), so each converter keeps a table of the
+# serials it has seen and works out a date only once. Converters are shared
+# by workbook date mode (1900 or 1904 based, see xlrd's Book.datemode) and
+# output format, so the table fills up over all the files read:
+#
+# convert = dateConverter(datemode)
+# convertColumns(records, ['maturity', 'interest start day'], convert)
+#
+# The default format is the one trustee.modifyDates() always used, without
+# padding (2018-2-13), iso=True gives 2018-02-13.
+#
+
+from datetime import date
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# date mode => day number (date.toordinal()) of serial 0. In the 1900 date
+# mode Excel counts 1900-02-29, which did not exist, so serial 0 is
+# 1899-12-30 for all the serials after it (61 onwards).
+EPOCH = { 0: date(1899, 12, 30).toordinal()
+		, 1: date(1904, 1, 1).toordinal()
+		}
+
+
+
+class DateConverter():
+	"""
+	Convert a serial to a date string, [function] serial => [string] date,
+	keeping the strings of the serials seen.
+	"""
+	def __init__(self, datemode=0, iso=False):
+		try:
+			self.epoch = EPOCH[datemode]
+		except KeyError:
+			logger.error('DateConverter(): invalid date mode {0}'.format(datemode))
+			raise ValueError
+
+		self.format = '{0:04d}-{1:02d}-{2:02d}' if iso else '{0}-{1}-{2}'
+		self.table = {}		# serial => date string
+
+
+	def __call__(self, serial):
+		try:
+			return self.table[serial]
+		except KeyError:
+			return self.add(serial)
+
+
+	def add(self, serial):
+		d = date.fromordinal(self.epoch + int(serial))
+		s = self.table[serial] = self.format.format(d.year, d.month, d.day)
+		return s
+
+
+	def column(self, serials):
+		"""
+		[list] serials => [list] date strings
+		"""
+		table = self.table
+		return [table[s] if s in table else self.add(s) for s in serials]
+
+
+
+"""
+(date mode, iso) => DateConverter
+"""
+_converters = {}
+
+def dateConverter(datemode=0, iso=False):
+	"""
+	[int] date mode, [Bool] iso => [DateConverter] shared by all callers
+		with the same date mode and format.
+	"""
+	try:
+		return _converters[(datemode, iso)]
+	except KeyError:
+		return _converters.setdefault((datemode, iso), DateConverter(datemode, iso))
+
+
+
+def convertColumns(records, headers, converter):
+	"""
+	[list] records, [list] headers, [DateConverter] converter => [list] the
+		records, with the values under the headers converted in place.
+
+	Each column is converted at once. Records without a header are left
+	as they are.
+	"""
+	for header in headers:
+		having = [record for record in records if header in record]
+		for (record, value) in zip(having, converter.column([r[header] for r in having])):
+			record[header] = value
+
+	return records
@@ -0,0 +1,273 @@
+# coding=utf-8
+#
+# Read the rows of a worksheet (the first by default) of an .xlsx file one
+# by one.
+#
+# xlrd.open_workbook() builds the whole cell grid of a workbook before the
+# first row can be read. An .xlsx file is a zip archive of xml files, so the
+# worksheet xml can be parsed as a stream instead: each <row> element is
+# turned into a line and then thrown away, memory used does not grow with
+# the number of rows. Only the shared string table (text values used in the
+# worksheet) is kept in memory.
+#
+# Values are the same as xlrd's row_values(): numbers (including dates) are
+# floats, text is a string, booleans are 1 or 0, errors are xlrd error codes
+# and empty cells are ''.
+#
+
+from zipfile import ZipFile
+from xml.etree.ElementTree import iterparse, parse
+from posixpath import join, normpath
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+ROW, CELL, VALUE, INLINE, TEXT, RICH = (MAIN + tag for tag in ('row', 'c', 'v', 'is', 't', 'r'))
+
+# error text => xlrd error code (xlrd.biffh.error_text_from_code reversed),
+# kept here so that xlrd is not needed to read an .xlsx file.
+ERROR_CODES = { '#NULL!': 0x00, '#DIV/0!': 0x07, '#VALUE!': 0x0F, '#REF!': 0x17
+			  , '#NAME?': 0x1D, '#NUM!': 0x24, '#N/A': 0x2A
+			  }
+
+ESCAPE = re.compile(r'_x[0-9A-Fa-f]{4}_')
+
+
+
+def isXlsx(fileName):
+	return fileName.lower().endswith(('.xlsx', '.xlsm'))
+
+
+
+def xlsxRows(fileName, sheet=0):
+	"""
+	[string] xlsx file, [int or string] sheet index or name
+		=> [generator] lines of the worksheet
+
+	Lines are as wide as the worksheet's <dimension>, which may count some
+	empty columns at the right that xlrd leaves out. Without a <dimension>
+	(it is optional), or if a row goes beyond it, a line is as wide as the
+	widest row so far, so a line is never shorter than the lines before it.
+	Like xlrd, empty rows in between come out as empty lines, and empty rows
+	at the end are left out.
+	"""
+	with ZipFile(fileName) as z:
+		worksheet, sharedStrings = workbookParts(z, sheet)
+		strings = readSharedStrings(z, sharedStrings)
+		with z.open(worksheet) as f:
+			yield from worksheetRows(f, strings)
+
+
+
+def worksheetRows(f, strings):
+	"""
+	[file] worksheet xml, [list] shared strings => [generator] lines
+	"""
+	width = 0		# the <dimension> width, or the widest row so far
+	nextRow = 0		# index of the next line to yield
+	rowIndex = -1	# index of the last <row>, for a <row> without 'r'
+	parent = None
+	for (event, elem) in iterparse(f, ('start', 'end')):
+		if event == 'start':
+			if elem.tag == MAIN + 'sheetData':
+				parent = elem
+			elif elem.tag == MAIN + 'dimension':
+				width = dimensionWidth(elem.get('ref', ''))
+			continue
+
+		if elem.tag != ROW:
+			continue
+
+		rowIndex = int(elem.get('r', rowIndex + 2)) - 1
+		values = rowValues(elem, strings, width)
+		if parent is not None:		# drop the row from the tree
+			parent.clear()
+
+		if all(v == '' for v in values):
+			continue	# yielded later if a row with values follows
+
+		width = len(values)
+
+		while nextRow < rowIndex:
+			yield [''] * width
+			nextRow = nextRow + 1
+
+		yield values
+		nextRow = rowIndex + 1
+
+
+
+def rowValues(row, strings, width):
+	"""
+	[Element] row, [list] shared strings, [int] width => [list] values
+	"""
+	values = [''] * width
+	column = 0
+	for cell in row.iter(CELL):
+		reference = cell.get('r')
+		if reference is not None:
+			column = columnIndex(reference)
+		if column >= len(values):
+			values.extend([''] * (column + 1 - len(values)))
+
+		values[column] = cellValue(cell, strings)
+		column = column + 1
+
+	return values
+
+
+
+def cellValue(cell, strings):
+	"""
+	[Element] cell, [list] shared strings => value of the cell
+	"""
+	cellType = cell.get('t', 'n')
+	if cellType == 'inlineStr':
+		inline = cell.find(INLINE)
+		return '' if inline is None else richText(inline)
+
+	v = cell.find(VALUE)
+	if v is None or v.text is None:
+		return ''
+	if cellType == 'n':
+		return float(v.text)
+	if cellType == 's':
+		return strings[int(v.text)]
+	if cellType == 'str':
+		return cookedText(v)
+	if cellType == 'b':
+		return 1 if v.text.strip() in ('1', 'true') else 0
+	if cellType == 'e':
+		return ERROR_CODES.get(v.text, ERROR_CODES['#N/A'])
+
+	logger.warning('cellValue(): unknown cell type {0}'.format(cellType))
+	return v.text
+
+
+
+def richText(elem):
+	"""
+	[Element] shared string <si> or inline string <is> => [string] text
+
+	Text of the <t> children, and of the <t> of rich text runs <r>, phonetic
+	runs are left out.
+	"""
+	texts = []
+	for child in elem:
+		if child.tag == TEXT:
+			texts.append(cookedText(child))
+		elif child.tag == RICH:
+			texts.extend(cookedText(t) for t in child.iter(TEXT))
+
+	return ''.join(texts)
+
+
+
+def cookedText(elem):
+	"""
+	Same as xlrd: strip white spaces unless xml:space is 'preserve', then
+	replace the _xHHHH_ escapes.
+	"""
+	t = elem.text or ''
+	if elem.get(XML_SPACE) != 'preserve':
+		t = t.strip('\t\n \r')
+	if '_' in t:
+		t = ESCAPE.sub(lambda m: chr(int(m.group(0)[2:6], 16)), t)
+
+	return t
+
+
+
+def readSharedStrings(z, name):
+	"""
+	[ZipFile] z, [string] part name or None => [list] shared strings
+	"""
+	if name is None:
+		return []
+
+	strings = []
+	with z.open(name) as f:
+		for (event, elem) in iterparse(f):
+			if elem.tag == MAIN + 'si':
+				strings.append(richText(elem))
+				elem.clear()
+
+	return strings
+
+
+
+def xlsxDatemode(fileName):
+	"""
+	[string] xlsx file => [int] 1 if dates are 1904 based, 0 otherwise
+	"""
+	with ZipFile(fileName) as z:
+		with z.open('xl/workbook.xml') as f:
+			properties = parse(f).getroot().find(MAIN + 'workbookPr')
+
+	if properties is None:
+		return 0
+	return 1 if properties.get('date1904', '0').strip().lower() in ('1', 'true') else 0
+
+
+
+def workbookParts(z, sheet=0):
+	"""
+	[ZipFile] z, [int or string] sheet index or name => [string] part name
+		of the worksheet, [string] part name of the shared strings, or None
+		if there is none.
+
+	Like xlrd, an index out of range raises IndexError, an unknown name
+	raises XLRDError.
+	"""
+	with z.open('xl/workbook.xml') as f:
+		sheets = parse(f).getroot().find(MAIN + 'sheets').findall(MAIN + 'sheet')
+
+	if isinstance(sheet, str):
+		try:
+			sheetElem = next(s for s in sheets if s.get('name') == sheet)
+		except StopIteration:
+			from xlrd import XLRDError
+			raise XLRDError('No sheet named <{0!r}>'.format(sheet))
+	else:
+		sheetElem = sheets[sheet]
+
+	targets = {}
+	with z.open('xl/_rels/workbook.xml.rels') as f:
+		for r in parse(f).getroot().iter(PACKAGE + 'Relationship'):
+			target = r.get('Target')
+			target = target[1:] if target.startswith('/') else normpath(join('xl', target))
+			targets[r.get('Id')] = target
+			if r.get('Type').endswith('/sharedStrings'):
+				targets['sharedStrings'] = target
+
+	return targets[sheetElem.get(RELATIONSHIP + 'id')], targets.get('sharedStrings')
+
+
+
+def columnIndex(reference):
+	"""
+	[string] cell reference like 'AB12' => [int] column index (AB => 27)
+	"""
+	column = 0
+	for c in reference:
+		if c.isdigit():
+			break
+		column = column * 26 + ord(c.upper()) - 64
+
+	return column - 1
+
+
+
+def dimensionWidth(ref):
+	"""
+	[string] worksheet dimension like 'A1:AK200' => [int] number of columns
+	"""
+	last = ref.split(':')[-1]
+	return columnIndex(last) + 1 if last[:1].isalpha() else 0